@@ -3,23 +3,99 @@
 AI Analysis Script for PR, Testing, and Deployment
 """
 
-import openai
 import json
 import sys
 import os
-import boto3
+import time
 from datetime import datetime, timedelta
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from cloudwatch_metrics import get_metric_data_incremental, latest_value, metric_query
+from diff_chunker import DiffChunker
+from lazy_loading import LazyModule, aws_client, lazy_attribute
+from llm_cache import LLMCache
+from log_reducer import LogReducer
+from metric_store import MetricStore
+
+openai = LazyModule('openai')
+
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH']
+
+def risk_rank(level):
+    """Order of a risk level, with unknown levels lowest"""
+    return RISK_LEVELS.index(level) if level in RISK_LEVELS else -1
 
 class AIAnalyzer:
-    def __init__(self, openai_api_key):
-        openai.api_key = openai_api_key
-        self.cloudwatch = boto3.client('cloudwatch')
-        self.ecs = boto3.client('ecs')
-        self.ecr = boto3.client('ecr')
+    def __init__(self, openai_api_key, metric_store=None, llm_cache=None, max_concurrency=4):
+        # openai, boto3 and the metric store are only loaded by the analyses that use them
+        self.openai_api_key = openai_api_key
+        self.max_concurrency = max_concurrency
+        if metric_store is not None:
+            self.metric_store = metric_store
+        self.llm_cache = llm_cache or LLMCache()
+    
+    @lazy_attribute
+    def metric_store(self):
+        return MetricStore()
+    
+    @lazy_attribute
+    def cloudwatch(self):
+        return aws_client('cloudwatch')
+    
+    @lazy_attribute
+    def ecs(self):
+        return aws_client('ecs')
+    
+    @lazy_attribute
+    def ecr(self):
+        return aws_client('ecr')
+    
+    def chat_completion(self, **kwargs):
+        # Cache hits never get here, so they never import openai
+        openai.api_key = self.openai_api_key
+        return openai.ChatCompletion.create(**kwargs)
+    
+    def complete(self, prompt, max_tokens, validate=None):
+        """GPT-4 completion text, served from the LLM cache when the same prompt was seen before"""
+        return self.llm_cache.chat_completion(
+            self.chat_completion,
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+            validate=validate,
+            max_tokens=max_tokens
+        )
     
     def analyze_pr_changes(self, diff_content, changed_files):
         """Analyze PR changes for risk assessment"""
+        # The diff (a string or an open diff file) is split per file into prompt-sized
+        # chunks; lockfiles and binaries are only listed with their line counts
+        lines = diff_content.splitlines(keepends=True) if isinstance(diff_content, str) else diff_content
+        chunker = DiffChunker()
+        chunks = list(chunker.chunks(lines)) or ['']
+        notes = chunker.notes()
+        
+        if len(chunks) == 1:
+            analysis = self.analyze_diff_chunk(chunks[0], changed_files, notes)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+                partial = list(executor.map(
+                    lambda part: self.analyze_diff_chunk(chunks[part], changed_files, notes, part, len(chunks)),
+                    range(len(chunks))
+                ))
+            partial = [analysis for analysis in partial if analysis]
+            analysis = self.merge_pr_analyses(partial, notes) if partial else None
+        
+        return analysis or {
+            "summary": "Analysis failed",
+            "risk_level": "UNKNOWN",
+            "risky_areas": [],
+            "testing_focus": []
+        }
+    
+    def analyze_diff_chunk(self, diff_chunk, changed_files, notes, part=0, parts=1):
+        """Analyze one chunk of a PR diff, returning None if the analysis fails"""
+        scope = f"This is part {part + 1} of {parts} of the diff.\n" if parts > 1 else ""
+        summarized = "\n        ".join(notes) if notes else "none"
         prompt = f"""
         Analyze this code diff and provide:
         1. A concise summary of changes (max 100 words)
@@ -29,8 +105,11 @@ class AIAnalyzer:
         
         Changed files: {changed_files}
         
-        Diff:
-        {diff_content}
+        Files changed but not shown (lockfiles, binaries, oversized diffs):
+        {summarized}
+        
+        {scope}Diff:
+        {diff_chunk}
         
         Respond in JSON format:
         {{
@@ -42,23 +121,59 @@ class AIAnalyzer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500
-            )
-            return json.loads(response.choices[0].message.content)
+            content = self.complete(prompt, max_tokens=500, validate=json.loads)
+            return json.loads(content)
         except Exception as e:
             print(f"Error in PR analysis: {e}")
-            return {
-                "summary": "Analysis failed",
-                "risk_level": "UNKNOWN",
-                "risky_areas": [],
-                "testing_focus": []
-            }
+            return None
+    
+    def merge_pr_analyses(self, partial, notes):
+        """Reduce per-chunk analyses into one result with the same schema"""
+        merged = {
+            "summary": " ".join(analysis.get("summary", "") for analysis in partial),
+            "risk_level": max((analysis.get("risk_level") for analysis in partial), key=risk_rank),
+            "risky_areas": list(dict.fromkeys(a for analysis in partial for a in analysis.get("risky_areas", [])))[:8],
+            "testing_focus": list(dict.fromkeys(t for analysis in partial for t in analysis.get("testing_focus", [])))[:8]
+        }
+        
+        prompt = f"""
+        These are analyses of consecutive parts of one PR diff:
+        {json.dumps(partial, indent=2)}
+        
+        Files changed but not shown: {", ".join(notes) if notes else "none"}
+        
+        Combine them into a single analysis: a concise summary of the whole PR (max 100 words),
+        the overall risk level, and the most important risky areas and testing focus (max 8 each).
+        
+        Respond in JSON format:
+        {{
+            "summary": "string",
+            "risk_level": "LOW|MEDIUM|HIGH",
+            "risky_areas": ["area1", "area2"],
+            "testing_focus": ["test1", "test2"]
+        }}
+        """
+        
+        try:
+            combined = json.loads(self.complete(prompt, max_tokens=500, validate=json.loads))
+        except Exception as e:
+            print(f"Error merging PR analyses: {e}")
+            return merged
+        
+        result = dict(merged, **{key: value for key, value in combined.items() if key in merged and value})
+        # The overall risk is never lower than the riskiest part
+        result["risk_level"] = max(merged["risk_level"], result["risk_level"], key=risk_rank)
+        return result
     
-    def analyze_test_results(self, test_logs):
+    def analyze_test_results(self, test_logs, local_only=False):
         """Analyze test results and provide insights"""
+        # Only a digest of the log (a string or an open log file) reaches the model:
+        # counts, failing tests with context and each distinct stack trace once
+        lines = test_logs.splitlines() if isinstance(test_logs, str) else test_logs
+        reducer = LogReducer().reduce(lines)
+        if local_only:
+            return reducer.summary()
+        
         prompt = f"""
         Analyze these test results and provide:
         1. Human-readable summary of test status
@@ -66,8 +181,8 @@ class AIAnalyzer:
         3. Recommendations for fixes
         4. Overall test health score (1-10)
         
-        Test logs:
-        {test_logs}
+        Test log digest:
+        {reducer.digest()}
         
         Respond in JSON format:
         {{
@@ -79,59 +194,43 @@ class AIAnalyzer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500
-            )
-            return json.loads(response.choices[0].message.content)
+            content = self.complete(prompt, max_tokens=500, validate=json.loads)
+            return json.loads(content)
         except Exception as e:
             print(f"Error in test analysis: {e}")
-            return {
-                "summary": "Test analysis failed",
-                "failures": [],
-                "recommendations": [],
-                "health_score": 5
-            }
+            # The local summary is still better than nothing
+            return dict(reducer.summary(), summary="Test analysis failed - local summary: " + reducer.summary()["summary"])
     
-    def analyze_deployment_risk(self, pr_summary, risk_level, image_tag):
-        """Analyze deployment risk and recommend strategy"""
-        # Get recent metrics
+    def recent_service_metrics(self):
+        """Latest hourly (error_rate, cpu_usage) of the service over the last 24 hours"""
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=24)
         
         try:
-            # Get error rate
-            error_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ApplicationELB',
-                MetricName='HTTPCode_Target_5XX_Count',
-                Dimensions=[{'Name': 'LoadBalancer', 'Value': 'cartoon-alb'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=3600,
-                Statistics=['Sum']
-            )
+            # Error rate and CPU usage in one request, reusing hourly datapoints cached by earlier runs
+            queries = [
+                metric_query('error_rate', 'AWS/ApplicationELB', 'HTTPCode_Target_5XX_Count',
+                             [{'Name': 'LoadBalancer', 'Value': 'cartoon-alb'}], 'Sum', 3600),
+                metric_query('cpu_usage', 'AWS/ECS', 'CPUUtilization',
+                             [{'Name': 'ServiceName', 'Value': 'cartoon-web-service'}], 'Average', 3600)
+            ]
+            series = get_metric_data_incremental(self.cloudwatch, self.metric_store, queries, start_time, end_time)
             
-            error_rate = error_response['Datapoints'][-1]['Sum'] if error_response['Datapoints'] else 0
-            
-            # Get CPU usage
-            cpu_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ECS',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'ServiceName', 'Value': 'cartoon-web-service'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=3600,
-                Statistics=['Average']
-            )
-            
-            cpu_usage = cpu_response['Datapoints'][-1]['Average'] if cpu_response['Datapoints'] else 0
+            error_rate = latest_value(series['error_rate'])
+            cpu_usage = latest_value(series['cpu_usage'])
             
         except Exception as e:
             print(f"Error getting metrics: {e}")
             error_rate = 0
             cpu_usage = 0
         
+        return error_rate, cpu_usage
+    
+    def analyze_deployment_risk(self, pr_summary, risk_level, image_tag, recent_metrics=None):
+        """Analyze deployment risk and recommend strategy"""
+        # recent_metrics lets the pipeline fetch metrics while the PR analysis is still running
+        error_rate, cpu_usage = recent_metrics or self.recent_service_metrics()
+        
         prompt = f"""
         Analyze deployment risk based on:
         1. Recent error rates: {error_rate}
@@ -156,12 +255,8 @@ class AIAnalyzer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400
-            )
-            return json.loads(response.choices[0].message.content)
+            content = self.complete(prompt, max_tokens=400, validate=json.loads)
+            return json.loads(content)
         except Exception as e:
             print(f"Error in deployment analysis: {e}")
             return {
@@ -195,53 +290,109 @@ class AIAnalyzer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800
-            )
-            return response.choices[0].message.content
+            content = self.complete(prompt, max_tokens=800)
+            return content
         except Exception as e:
             print(f"Error generating deployment summary: {e}")
             return f"Deployment {image_tag} completed at {deployment_time}. Metrics: {metrics}"
+    
+    def run_pipeline(self, diff_path, changed_files, test_log_path, image_tag,
+                     deployment_time=None, metrics=None, local_tests=False):
+        """Run every analysis in one process, concurrently where the stages are independent"""
+        # The PR and test analyses, the CloudWatch fetch and the deployment summary run
+        # in parallel; only the deployment risk analysis waits, for the PR result.
+        timings = {}
+        
+        def timed(stage, function, *args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings[stage] = round(time.perf_counter() - start_time, 3)
+        
+        def analyze_pr():
+            with open(diff_path, 'r', errors='replace') as diff_file:
+                return self.analyze_pr_changes(diff_file, changed_files)
+        
+        def analyze_tests():
+            with open(test_log_path, 'r', errors='replace') as test_log:
+                return self.analyze_test_results(test_log, local_only=local_tests)
+        
+        pipeline_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pr_future = executor.submit(timed, 'pr', analyze_pr)
+            test_future = executor.submit(timed, 'test', analyze_tests)
+            metrics_future = executor.submit(timed, 'deploy_metrics', self.recent_service_metrics)
+            summary_future = None
+            if metrics is not None:
+                summary_future = executor.submit(
+                    timed, 'summary', self.generate_deployment_summary,
+                    image_tag, deployment_time or datetime.utcnow().isoformat(), metrics
+                )
+            
+            pr_result = pr_future.result()
+            deploy_result = timed(
+                'deploy', self.analyze_deployment_risk,
+                pr_result.get('summary', ''), pr_result.get('risk_level', 'UNKNOWN'), image_tag,
+                recent_metrics=metrics_future.result()
+            )
+            
+            result = {
+                'pr': pr_result,
+                'test': test_future.result(),
+                'deploy': deploy_result
+            }
+            if summary_future:
+                result['summary'] = summary_future.result()
+        
+        timings['total'] = round(time.perf_counter() - pipeline_start, 3)
+        result['timings'] = timings
+        return result
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python3 ai_analysis.py <analysis_type> [args...]")
+        print("Usage: python3 ai_analysis.py <analysis_type> [args...] [--no-cache]")
         sys.exit(1)
     
     analysis_type = sys.argv[1]
+    
+    # --no-cache (or LLM_CACHE=off) always calls the API; --local analyzes test logs without it
+    no_cache = '--no-cache' in sys.argv
+    if no_cache:
+        sys.argv.remove('--no-cache')
+    local_tests = '--local' in sys.argv
+    if local_tests:
+        sys.argv.remove('--local')
+    
     openai_api_key = os.getenv('OPENAI_API_KEY')
     
     if not openai_api_key:
         print("Error: OPENAI_API_KEY environment variable not set")
         sys.exit(1)
     
-    analyzer = AIAnalyzer(openai_api_key)
+    analyzer = AIAnalyzer(openai_api_key, llm_cache=LLMCache(enabled=False) if no_cache else None)
     
     if analysis_type == "pr":
         if len(sys.argv) < 4:
             print("Usage: python3 ai_analysis.py pr <diff_file> <changed_files>")
             sys.exit(1)
         
-        with open(sys.argv[2], 'r') as f:
-            diff_content = f.read()
-        
         with open(sys.argv[3], 'r') as f:
             changed_files = f.read()
         
-        result = analyzer.analyze_pr_changes(diff_content, changed_files)
+        # The diff is streamed, so its size does not matter
+        with open(sys.argv[2], 'r', errors='replace') as diff_file:
+            result = analyzer.analyze_pr_changes(diff_file, changed_files)
         print(json.dumps(result))
     
     elif analysis_type == "test":
         if len(sys.argv) < 3:
-            print("Usage: python3 ai_analysis.py test <test_log_file>")
+            print("Usage: python3 ai_analysis.py test <test_log_file> [--local]")
             sys.exit(1)
         
-        with open(sys.argv[2], 'r') as f:
-            test_logs = f.read()
-        
-        result = analyzer.analyze_test_results(test_logs)
+        # The log is streamed; with --local the reducer's own summary is returned
+        with open(sys.argv[2], 'r', errors='replace') as f:
+            result = analyzer.analyze_test_results(f, local_only=local_tests)
         print(json.dumps(result))
     
     elif analysis_type == "deploy":
@@ -256,6 +407,22 @@ def main():
         result = analyzer.analyze_deployment_risk(pr_summary, risk_level, image_tag)
         print(json.dumps(result))
     
+    elif analysis_type == "pipeline":
+        if len(sys.argv) < 6:
+            print("Usage: python3 ai_analysis.py pipeline <diff_file> <changed_files> <test_log_file> <image_tag> "
+                  "[metrics_json] [deployment_time] [--local]")
+            sys.exit(1)
+        
+        with open(sys.argv[3], 'r') as f:
+            changed_files = f.read()
+        
+        metrics = json.loads(sys.argv[6]) if len(sys.argv) > 6 else None
+        deployment_time = sys.argv[7] if len(sys.argv) > 7 else None
+        
+        result = analyzer.run_pipeline(sys.argv[2], changed_files, sys.argv[4], sys.argv[5],
+                                       deployment_time, metrics, local_tests=local_tests)
+        print(json.dumps(result))
+    
     elif analysis_type == "summary":
         if len(sys.argv) < 4:
             print("Usage: python3 ai_analysis.py summary <image_tag> <deployment_time> <metrics_json>")
@@ -271,6 +438,8 @@ def main():
     else:
         print(f"Unknown analysis type: {analysis_type}")
         sys.exit(1)
+    
+    analyzer.llm_cache.report()
 
 if __name__ == "__main__":
     main()
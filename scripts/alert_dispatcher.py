@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Non-blocking Slack alert delivery for the deployment monitor
+"""
+
+import queue
+import re
+import threading
+import time
+from lazy_loading import LazyModule
+from telemetry import Telemetry
+
+# Imported when the first dispatcher is created, not when the monitor starts up
+requests = LazyModule('requests')
+
+# Metric values: numbers with a unit or percent sign, and bare decimals. Numbers inside
+# identifiers (web-1, revision :12) are left alone so different services never merge.
+METRIC_VALUES = re.compile(r'(?<![\w.:-])[0-9]+(\.[0-9]+)?(\s?(%|ms|s|KB|MB|GB)\b|%)'
+                           r'|(?<![\w.:-])[0-9]+\.[0-9]+(?![\w.])')
+# Alerts of these severities are always delivered, never coalesced
+NEVER_COALESCE = {'CRITICAL'}
+
+class AlertDispatcher:
+    """Background Slack delivery with a bounded queue, coalescing, rate limiting and retries"""
+    def __init__(self, webhook_url, max_queue=100, coalesce_window=60, max_per_minute=20,
+                 max_retries=3, backoff=1.0, timeout=5, session=None, telemetry=None):
+        self.webhook_url = webhook_url
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.coalesce_window = coalesce_window
+        self.min_spacing = 60.0 / max_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.telemetry = telemetry or Telemetry()
+        self.session = session or self.create_session()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.last_sent = 0.0
+        # Coalescing key -> [window start, alerts suppressed in the window]
+        self.recent = {}
+        self.stats = {'queued': 0, 'sent': 0, 'coalesced': 0, 'dropped': 0, 'failed': 0, 'retries': 0}
+    
+    def create_session(self):
+        """Keep-alive session so repeated alerts reuse one connection to Slack"""
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def coalesce_key(self, message, severity):
+        """Alerts that differ only in their metric values are considered the same alert"""
+        if severity in NEVER_COALESCE:
+            return None
+        return f"{severity}:{METRIC_VALUES.sub('#', message)}"
+    
+    def submit(self, payload, message, severity):
+        """Queue a Slack payload without blocking; returns False if it was coalesced or dropped"""
+        key = self.coalesce_key(message, severity)
+        now = time.monotonic()
+        
+        with self.lock:
+            window = self.recent.get(key) if key else None
+            if window and now - window[0] < self.coalesce_window:
+                window[1] += 1
+                self.stats['coalesced'] += 1
+                return False
+            
+            suppressed = window[1] if window else 0
+            if key:
+                self.recent[key] = [now, 0]
+            
+            # Forget windows that have expired so the map stays small
+            if len(self.recent) > 1000:
+                self.recent = {k: w for k, w in self.recent.items() if now - w[0] < self.coalesce_window}
+            
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='alert-dispatcher', daemon=True)
+                self.thread.start()
+        
+        if suppressed:
+            payload = dict(payload, text=f"{payload['text']}\n(+{suppressed} similar alerts suppressed)")
+        
+        try:
+            self.queue.put_nowait(payload)
+            self.stats['queued'] += 1
+            return True
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+    
+    def run(self):
+        while True:
+            payload = self.queue.get()
+            if payload is None:
+                return
+            
+            # Rate limit: keep at least min_spacing between deliveries
+            wait = self.last_sent + self.min_spacing - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            
+            self.deliver(payload)
+            self.last_sent = time.monotonic()
+    
+    def deliver(self, payload):
+        """POST one payload, retrying timeouts, 429s and 5xx with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * (2 ** attempt)
+            try:
+                self.telemetry.count('api_calls', api='slack', operation='post')
+                with self.telemetry.span('slack.post', attempt=attempt + 1):
+                    response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+                if response.status_code >= 400:
+                    self.telemetry.count('api_errors', api='slack', operation='post')
+                if response.status_code == 429:
+                    delay = float(response.headers.get('Retry-After', delay))
+                elif response.status_code < 500:
+                    response.raise_for_status()
+                    self.stats['sent'] += 1
+                    return True
+            except requests.exceptions.HTTPError as e:
+                # Other 4xx errors will not succeed on retry
+                print(f"Error sending Slack alert: {e}")
+                break
+            except Exception as e:
+                self.telemetry.count('api_errors', api='slack', operation='post')
+                print(f"Error sending Slack alert (attempt {attempt + 1}): {e}")
+            
+            if attempt < self.max_retries:
+                self.stats['retries'] += 1
+                self.telemetry.count('api_retries', api='slack', operation='post')
+                time.sleep(delay)
+        
+        self.stats['failed'] += 1
+        return False
+    
+    def close(self, timeout=10):
+        """Flush queued alerts for up to timeout seconds, then stop the worker"""
+        if self.thread is None:
+            return
+        
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.session.close()
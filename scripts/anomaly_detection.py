@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Fast local anomaly detection over deployment metric history
+"""
+
+import numpy as np
+
+SEVERITY_LEVELS = [(10.0, 'CRITICAL'), (6.0, 'HIGH'), (4.0, 'MEDIUM'), (0.0, 'LOW')]
+
+class LocalAnomalyDetector:
+    """Streaming EWMA, z-score, hour-of-day seasonal and CUSUM detector"""
+    # State is a few NumPy arrays of shape (streams, metrics), so one update scores
+    # every service at once in microseconds however long the history is. Only
+    # increases are anomalous: errors, latency, CPU and memory are bad when they rise.
+    def __init__(self, metric_names, stream_names=None, alpha=0.2, z_threshold=4.0, cusum_drift=0.5,
+                 cusum_threshold=8.0, warmup=5, min_std=None, seasonal_alpha=0.1):
+        self.metric_names = list(metric_names)
+        self.stream_names = list(stream_names) if stream_names else [None]
+        self.shape = (len(self.stream_names), len(self.metric_names))
+        self.alpha = alpha
+        self.seasonal_alpha = seasonal_alpha
+        self.z_threshold = z_threshold
+        self.cusum_drift = cusum_drift
+        self.cusum_threshold = cusum_threshold
+        self.warmup = warmup
+        # Floor on the standard deviation so flat series don't turn noise into huge z-scores
+        self.min_std = np.ones(self.shape[1]) if min_std is None else np.asarray(min_std, dtype=float)
+        
+        self.count = 0
+        self.mean = np.zeros(self.shape)
+        self.var = np.zeros(self.shape)
+        self.cusum = np.zeros(self.shape)
+        self.seasonal_mean = np.zeros((24,) + self.shape)
+        self.seasonal_count = np.zeros(24, dtype=int)
+    
+    def _learn(self, values, hour, mask=None):
+        # Anomalous samples are learned at a tenth of the usual rate, so a spike barely
+        # moves the baseline but a lasting level shift is eventually accepted
+        damping = 1.0 if mask is None else np.where(mask, 0.1, 1.0)
+        if self.count == 0:
+            self.mean = values.copy()
+        else:
+            alpha = self.alpha * damping
+            diff = values - self.mean
+            increment = alpha * diff
+            self.mean = self.mean + increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+        
+        if self.seasonal_count[hour] == 0:
+            self.seasonal_mean[hour] = values
+        else:
+            self.seasonal_mean[hour] += self.seasonal_alpha * damping * (values - self.seasonal_mean[hour])
+        self.seasonal_count[hour] += 1
+        self.count += 1
+    
+    def prime(self, history):
+        """Learn from historical (timestamp, values) samples without flagging anything"""
+        for timestamp, values in history:
+            self._learn(np.asarray(values, dtype=float).reshape(self.shape), timestamp.hour)
+    
+    def update(self, values, timestamp):
+        """Score one sample per stream and learn from it, returning (scores, flagged) arrays"""
+        values = np.asarray(values, dtype=float).reshape(self.shape)
+        hour = timestamp.hour
+        
+        if self.count < self.warmup:
+            self._learn(values, hour)
+            return np.zeros(self.shape), np.zeros(self.shape, dtype=bool)
+        
+        std = np.maximum(np.sqrt(self.var), self.min_std)
+        z_scores = (values - self.mean) / std
+        
+        # Seasonal baseline only counts once the hour bucket has seen a few samples
+        if self.seasonal_count[hour] >= 3:
+            seasonal_z = (values - self.seasonal_mean[hour]) / std
+        else:
+            seasonal_z = z_scores
+        
+        self.cusum = np.maximum(0.0, self.cusum + z_scores - self.cusum_drift)
+        change_point = self.cusum > self.cusum_threshold
+        
+        flagged = ((z_scores > self.z_threshold) & (seasonal_z > self.z_threshold)) | change_point
+        scores = np.where(change_point, np.maximum(z_scores, self.cusum / 2), np.minimum(z_scores, seasonal_z))
+        
+        self._learn(values, hour, mask=flagged)
+        self.cusum = np.where(change_point, 0.0, self.cusum)
+        return scores, flagged
+    
+    def result(self, scores, flagged):
+        """Detection result for one stream in the same shape as the LLM anomaly analysis"""
+        anomaly_detected = bool(np.any(flagged))
+        top_score = float(np.max(np.where(flagged, scores, 0.0))) if anomaly_detected else 0.0
+        severity = next(level for bound, level in SEVERITY_LEVELS if top_score >= bound)
+        flagged_metrics = [name for name, flag in zip(self.metric_names, flagged) if flag]
+        
+        return {
+            'anomaly_detected': anomaly_detected,
+            'severity': severity if anomaly_detected else 'LOW',
+            'causes': [f"{name} deviates from baseline" for name in flagged_metrics],
+            'recommendations': [],
+            'rollback_recommended': anomaly_detected and severity == 'CRITICAL',
+            'confidence': min(0.99, top_score / (2 * self.z_threshold)) if anomaly_detected else 0.0,
+            'flagged_metrics': flagged_metrics,
+            'scores': {name: round(float(score), 2) for name, score in zip(self.metric_names, scores)},
+            'source': 'local'
+        }
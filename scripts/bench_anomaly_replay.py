@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark comparing local anomaly gating with an LLM call on every tick
+"""
+
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import monitor_deployment
+from local_fakes import FakeCloudWatch, FakeOpenAI
+from metric_store import MetricStore
+
+# Ratio of each TargetResponseTime percentile to the average in the synthetic traces
+TAIL_FACTORS = {'p50_latency': 0.8, 'p90_latency': 1.8, 'p99_latency': 3.5, 'p999_latency': 6.0}
+
+def synthetic_trace(ticks=360, incident_at=300, seed=7):
+    """One-minute metric samples with a daily cycle, noise and an incident injected at incident_at"""
+    rng = random.Random(seed)
+    # Separate stream for the latency percentiles, so the other metrics stay as they were
+    tail_rng = random.Random(seed + 1000)
+    start = datetime(2024, 1, 1, 6, 0)
+    trace = []
+    for tick in range(ticks):
+        cycle = math.sin(2 * math.pi * tick / 1440)
+        sample = {
+            'error_rate': max(0.0, rng.gauss(2 + cycle, 1.0)),
+            'avg_latency': max(0.0, rng.gauss(0.25 + 0.05 * cycle, 0.02)),
+            'cpu_usage': rng.gauss(40 + 10 * cycle, 3.0),
+            'memory_usage': rng.gauss(55, 2.0),
+            'timestamp': (start + timedelta(minutes=tick)).isoformat()
+        }
+        if tick >= incident_at:
+            sample['error_rate'] += 25
+            sample['avg_latency'] += 0.4
+        # Latency in seconds like TargetResponseTime, percentiles spread around the average
+        for name, factor in TAIL_FACTORS.items():
+            sample[name] = max(0.0, sample['avg_latency'] * factor * tail_rng.gauss(1.0, 0.05))
+        trace.append(sample)
+    return trace
+
+def replay(trace, incident_at, llm_latency):
+    """Replay a trace through DeploymentMonitor.detect_anomalies with local stand-ins"""
+    fake_openai = FakeOpenAI(responder=lambda messages: json.dumps({
+        'anomaly_detected': True,
+        'severity': 'HIGH',
+        'causes': ['replayed incident'],
+        'recommendations': [],
+        'rollback_recommended': False,
+        'confidence': 0.9
+    }))
+    monitor_deployment.openai = fake_openai
+    monitor = monitor_deployment.DeploymentMonitor(
+        'replay', metric_store=MetricStore(':memory:'), cloudwatch=FakeCloudWatch(), ecs=object(), alb=object()
+    )
+    
+    tick_times = []
+    false_positives = 0
+    detected_at = None
+    for tick, sample in enumerate(trace):
+        metrics = {
+            'values': np.array([[sample[name] for name in monitor_deployment.METRIC_NAMES]]) * monitor_deployment.METRIC_SCALE,
+            'timestamp': sample['timestamp']
+        }
+        start = time.perf_counter()
+        analyses = monitor.detect_anomalies(metrics)
+        tick_times.append(time.perf_counter() - start)
+        
+        if any(analysis['anomaly_detected'] for analysis in analyses):
+            if tick < incident_at:
+                false_positives += 1
+            elif detected_at is None:
+                detected_at = tick
+    
+    local_us = sorted(t * 1e6 for t in tick_times)
+    return {
+        'ticks': len(trace),
+        'llm_calls': len(fake_openai.calls),
+        'false_positive_ticks': false_positives,
+        'detection_delay_ticks': None if detected_at is None else detected_at - incident_at,
+        'detection_latency_ms': None if detected_at is None else tick_times[detected_at] * 1000 + llm_latency * 1000,
+        'local_tick_us_p50': local_us[len(local_us) // 2],
+        'local_tick_us_max': local_us[-1]
+    }
+
+def main():
+    # Usage: python3 bench_anomaly_replay.py [llm_latency_seconds] [trace_json] [incident_tick]
+    llm_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    incident_at = 300
+    trace = synthetic_trace(incident_at=incident_at)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'r') as f:
+            trace = json.load(f)
+        incident_at = int(sys.argv[3]) if len(sys.argv) > 3 else len(trace)
+    
+    gated = replay(trace, incident_at, llm_latency)
+    
+    # Previous behaviour: one GPT-4 round-trip per tick, detecting on the first incident tick
+    every_tick = {
+        'ticks': len(trace),
+        'llm_calls': len(trace),
+        'detection_delay_ticks': 0 if incident_at < len(trace) else None,
+        'detection_latency_ms': llm_latency * 1000,
+        'llm_seconds_total': llm_latency * len(trace)
+    }
+    gated['llm_seconds_total'] = llm_latency * gated['llm_calls']
+    
+    print(json.dumps({'llm_every_tick': every_tick, 'local_gated': gated}, indent=2))
+
+if __name__ == "__main__":
+    main()
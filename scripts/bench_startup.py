@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the CI scripts, checked against a committed budget
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_PATH = os.path.join(SCRIPTS_DIR, 'startup_budget.json')
+
+# name -> (code run in a fresh interpreter, modules it must not import)
+CASES = {
+    'ai_analysis_import': (
+        "import ai_analysis; ai_analysis.AIAnalyzer('key')",
+        ['boto3', 'botocore', 'openai']
+    ),
+    'ai_analysis_test_local': (
+        "import runpy; sys.argv = ['ai_analysis.py', 'test', LOG_PATH, '--local']\n"
+        "try:\n    runpy.run_path('ai_analysis.py', run_name='__main__')\nexcept SystemExit:\n    pass",
+        ['boto3', 'botocore', 'openai']
+    ),
+    'monitor_deployment_import': (
+        "import monitor_deployment; from metric_store import MetricStore\n"
+        "monitor_deployment.DeploymentMonitor('key', metric_store=MetricStore(':memory:'))",
+        ['boto3', 'botocore', 'openai', 'requests']
+    ),
+    'setup_monitoring_import': (
+        "import setup_monitoring; setup_monitoring.MonitoringSetup()",
+        ['boto3', 'botocore']
+    ),
+    'health_check_import': (
+        "import health_check; health_check.HealthChecker('http://localhost')",
+        ['boto3', 'botocore', 'openai']
+    )
+}
+
+WRAPPER = """
+import json, sys
+sys.path.insert(0, {scripts_dir!r})
+LOG_PATH = {log_path!r}
+{code}
+print(json.dumps([m for m in {forbidden!r} if m in sys.modules]), file=sys.stderr)
+"""
+
+def run_case(code, forbidden, workdir, log_path):
+    """Wall time in ms of one fresh interpreter running code, and the forbidden modules it imported"""
+    env = dict(os.environ,
+               OPENAI_API_KEY='startup-benchmark',
+               METRICS_CACHE_PATH=os.path.join(workdir, 'metrics.db'),
+               LLM_CACHE_PATH=os.path.join(workdir, 'llm-cache.db'),
+               TASK_DEFINITION_INDEX_PATH=os.path.join(workdir, 'task-definitions.json'))
+    source = WRAPPER.format(scripts_dir=SCRIPTS_DIR, log_path=log_path, code=code, forbidden=forbidden)
+    
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', source], cwd=SCRIPTS_DIR, env=env,
+                            capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return elapsed, json.loads(result.stderr.strip().splitlines()[-1])
+
+def benchmark(runs=5):
+    """Median startup time of every case over runs interpreters"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, 'test.log')
+        with open(log_path, 'w') as f:
+            f.write("PASS src/App.test.js\n  ✓ renders without crashing (12 ms)\n"
+                    "Tests:       1 passed, 1 total\n")
+        
+        for name, (code, forbidden) in CASES.items():
+            times = []
+            for _ in range(runs):
+                elapsed, imported = run_case(code, forbidden, workdir, log_path)
+                times.append(elapsed)
+            results[name] = {'median_ms': round(statistics.median(times), 1), 'unexpected_imports': imported}
+    return results
+
+def main():
+    # Usage: python3 bench_startup.py [runs] [--update-budget]
+    update = '--update-budget' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--update-budget']
+    runs = int(args[0]) if args else 5
+    
+    results = benchmark(runs)
+    
+    if update:
+        # Budgets leave 2x headroom over this machine so slower CI runners pass
+        budget = {name: round(result['median_ms'] * 2, -1) for name, result in results.items()}
+        with open(BUDGET_PATH, 'w') as f:
+            json.dump(budget, f, indent=2)
+            f.write('\n')
+    
+    with open(BUDGET_PATH, 'r') as f:
+        budget = json.load(f)
+    
+    failures = []
+    for name, result in results.items():
+        result['budget_ms'] = budget.get(name)
+        if result['budget_ms'] is not None and result['median_ms'] > result['budget_ms']:
+            failures.append(f"{name}: {result['median_ms']}ms exceeds the {result['budget_ms']}ms budget")
+        if result['unexpected_imports']:
+            failures.append(f"{name}: imports {', '.join(result['unexpected_imports'])} at startup")
+    
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the monitoring scripts, checked against a recorded baseline
+"""
+
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import ai_analysis
+import monitor_deployment
+import setup_monitoring
+from alert_dispatcher import AlertDispatcher
+from bench_anomaly_replay import synthetic_trace
+from health_check import HealthChecker
+from llm_cache import LLMCache
+from local_fakes import FakeCloudWatch, FakeECS, FakeOpenAI, FakeSlackServer, FakeWebApp
+from metric_store import MetricStore
+from task_definition_index import TaskDefinitionIndex
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACES_DIR = os.path.join(SCRIPTS_DIR, 'traces')
+BASELINE_PATH = os.path.join(SCRIPTS_DIR, 'bench_baseline.json')
+
+# Allowed slack before a result counts as a regression, by metric name suffix:
+# timings and memory vary between machines, counts are deterministic
+TOLERANCES = {'_ms': 0.5, '_seconds': 0.5, '_kb': 0.25, '_rps': 0.5, '_calls': 0.0, '_messages': 0.0, '_ticks': 0.0}
+HIGHER_IS_BETTER = ('_rps',)
+# Absolute slack on top, so sub-millisecond timings do not flag on a few milliseconds of scheduler noise
+ABSOLUTE_SLACK = {'_ms': 3.0, '_seconds': 0.05, '_kb': 64.0}
+# Deviation (in standard deviations) the fake model treats as critical
+SEVERE_DEVIATION = 8.0
+
+class ReplayClock(datetime):
+    """datetime whose utcnow() is the replayed time, patched into monitor_deployment"""
+    current = None
+    
+    @classmethod
+    def utcnow(cls):
+        return cls.current
+
+@contextlib.contextmanager
+def patched(module, name, value):
+    original = getattr(module, name)
+    setattr(module, name, value)
+    try:
+        yield value
+    finally:
+        setattr(module, name, original)
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the scripts' progress output so printing does not dominate the timings"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def measured(function, *args, **kwargs):
+    """Run a scenario, then again under tracemalloc for its peak Python heap use"""
+    # tracemalloc slows allocation-heavy code several times over, so timings come from the untraced run
+    result = function(*args, **kwargs)
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        result['peak_memory_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def record_traces():
+    """Write the replay traces: an error spike, a gradual latency regression and a steady run"""
+    os.makedirs(TRACES_DIR, exist_ok=True)
+    rng = random.Random(11)
+    
+    steady = synthetic_trace(ticks=240, incident_at=240, seed=3)
+    spike = synthetic_trace(ticks=360, incident_at=300, seed=7)
+    regression = synthetic_trace(ticks=360, incident_at=360, seed=5)
+    for tick, sample in enumerate(regression[240:], 240):
+        ramp = (tick - 240) / 120
+        sample['avg_latency'] += 0.8 * ramp + rng.gauss(0, 0.01)
+        # A slow tail: the high percentiles degrade much faster than the average
+        sample['p90_latency'] += 1.2 * ramp
+        sample['p99_latency'] += 5.0 * ramp
+        sample['p999_latency'] += 8.0 * ramp
+        sample['cpu_usage'] += 30 * ramp
+    
+    traces = {
+        'steady': (steady, None),
+        'error_spike': (spike, 300),
+        'latency_regression': (regression, 240)
+    }
+    for name, (samples, incident_at) in traces.items():
+        trace = {
+            'name': name,
+            'interval_seconds': 60,
+            'incident_at': incident_at,
+            'samples': [{key: round(value, 4) for key, value in sample.items() if key != 'timestamp'}
+                        for sample in samples]
+        }
+        with open(os.path.join(TRACES_DIR, f'{name}.json'), 'w') as f:
+            json.dump(trace, f, separators=(',', ':'))
+            f.write('\n')
+
+def load_traces():
+    traces = {}
+    for filename in sorted(os.listdir(TRACES_DIR)):
+        if filename.endswith('.json'):
+            with open(os.path.join(TRACES_DIR, filename), 'r') as f:
+                trace = json.load(f)
+            traces[trace['name']] = trace
+    return traces
+
+def triage(messages):
+    """Fake model verdict: severe deviations in the anomaly prompt are critical and worth a rollback"""
+    scores = re.search(r'Deviation scores[^:]*: \{(.*)\}', messages[0]['content'])
+    top = max((float(v) for v in re.findall(r': (-?[\d.]+)', scores.group(1))), default=0.0) if scores else 0.0
+    critical = top >= SEVERE_DEVIATION
+    return json.dumps({
+        'anomaly_detected': True,
+        'severity': 'CRITICAL' if critical else 'MEDIUM',
+        'causes': [f'deviation of {top:.1f} standard deviations'],
+        'recommendations': ['roll back' if critical else 'keep watching'],
+        'rollback_recommended': critical,
+        'confidence': 0.9
+    })
+
+def bench_monitor(trace, workdir):
+    """Replay a metric trace through DeploymentMonitor.run_tick against fake CloudWatch, ECS, OpenAI and Slack"""
+    samples = trace['samples']
+    interval = timedelta(seconds=trace['interval_seconds'])
+    incident_at = trace['incident_at']
+    # Replays start at midnight so the detector's hour-of-day buckets line up the same on every run
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    
+    slack = FakeSlackServer()
+    fake_openai = FakeOpenAI(responder=triage)
+    cloudwatch = FakeCloudWatch()
+    ecs = FakeECS(settle_after=1)
+    target = monitor_deployment.DEFAULT_TARGETS[0]
+    family_arn = f"arn:aws:ecs:us-east-1:000000000000:task-definition/{target['task_family']}"
+    ecs.register_task_definitions(*[f'{family_arn}:{revision}' for revision in range(1, 6)])
+    ecs.add_service(target['cluster'], target['service'], f'{family_arn}:5')
+    
+    with patched(monitor_deployment, 'openai', fake_openai), patched(monitor_deployment, 'datetime', ReplayClock):
+        ReplayClock.current = start
+        monitor = monitor_deployment.DeploymentMonitor(
+            'bench', metric_store=MetricStore(':memory:'), cloudwatch=cloudwatch, ecs=ecs, alb=object(),
+            task_index=TaskDefinitionIndex(os.path.join(workdir, f"{trace['name']}-index.json"))
+        )
+        monitor.alert_dispatcher = AlertDispatcher(slack.url, max_per_minute=60000, backoff=0.01)
+        monitor.slack_webhook_url = slack.url
+        
+        # error_rate is derived from the ALB counts, so replay it as 5XX responses out of 1000 requests
+        counts = {'errors': lambda sample: sample['error_rate'] * 10, 'requests': lambda sample: 1000.0}
+        for query in monitor.metric_queries(300):
+            name = query['Id'].rsplit('_', 1)[0]
+            value = counts.get(name, lambda sample: sample[name])
+            stat = query['MetricStat']
+            metric = stat['Metric']
+            cloudwatch.put_datapoints(metric['Namespace'], metric['MetricName'], metric['Dimensions'], stat['Stat'],
+                                      [(start + interval * tick, value(sample)) for tick, sample in enumerate(samples)])
+        
+        alert_ticks = []
+        send_alert = monitor.send_alert
+        tick = 0
+        
+        def record_alert(message, severity="INFO"):
+            alert_ticks.append(tick)
+            send_alert(message, severity)
+        monitor.send_alert = record_alert
+        
+        tick_times = []
+        rollback_tick = None
+        rolled_back = set()
+        with quiet():
+            monitor.preload_rollback_targets()
+            for tick in range(len(samples)):
+                ReplayClock.current = start + interval * tick + timedelta(seconds=1)
+                tick_start = time.perf_counter()
+                monitor.run_tick(rolled_back)
+                tick_times.append((time.perf_counter() - tick_start) * 1000)
+                if rollback_tick is None and ecs.call_count('update_service'):
+                    rollback_tick = tick
+            monitor.wait_for_recoveries(timeout=5)
+            monitor.alert_dispatcher.close()
+    slack.close()
+    
+    incident_alerts = [t for t in alert_ticks if incident_at is not None and t >= incident_at]
+    return {
+        'ticks': len(samples),
+        'tick_p50_ms': round(percentile(tick_times, 0.5), 3),
+        'tick_p99_ms': round(percentile(tick_times, 0.99), 3),
+        'detection_ticks': incident_alerts[0] - incident_at if incident_alerts else None,
+        'rollback_ticks': (rollback_tick - incident_at
+                           if None not in (rollback_tick, incident_at) and rollback_tick >= incident_at else None),
+        'false_alert_ticks': len({t for t in alert_ticks if incident_at is None or t < incident_at}),
+        'cloudwatch_calls': cloudwatch.call_count('get_metric_data'),
+        'llm_calls': len(fake_openai.calls),
+        'ecs_calls': len(ecs.calls),
+        'slack_messages': len(slack.messages)
+    }
+
+def synthetic_diff(files=40, lockfile_lines=20000):
+    """A unified diff with many source files and one large lockfile change"""
+    lines = []
+    for index in range(files):
+        path = f'src/components/Component{index}.js'
+        lines += [f'diff --git a/{path} b/{path}', f'--- a/{path}', f'+++ b/{path}', '@@ -1,30 +1,34 @@']
+        lines += [f'+const value{line} = compute({line}, props.item{index});' for line in range(30)]
+    lines += ['diff --git a/package-lock.json b/package-lock.json', '--- a/package-lock.json',
+              '+++ b/package-lock.json', f'@@ -1,1 +1,{lockfile_lines} @@']
+    lines += [f'+    "node_modules/pkg-{line}": {{"version": "1.0.{line}"}},' for line in range(lockfile_lines)]
+    return '\n'.join(lines) + '\n'
+
+def synthetic_test_log(passing=5000, failing=40):
+    lines = ['PASS src/components/Component.test.js']
+    lines += [f'  ✓ renders case {index} ({index % 30} ms)' for index in range(passing)]
+    lines += ['FAIL src/App.test.js'] + [f'  ✕ handles payment step {index} (15 ms)' for index in range(failing)]
+    for index in range(failing):
+        lines += [f'  ● App › handles payment step {index}', '',
+                  '    TypeError: Cannot read properties of undefined (reading \'amount\')', '',
+                  f'      at PaymentForm (src/components/PaymentForm.js:{40 + index % 3}:18)',
+                  '      at renderWithHooks (node_modules/react-dom/cjs/react-dom.development.js:16305:18)', '']
+    lines.append(f'Tests:       {failing} failed, {passing} passed, {passing + failing} total')
+    return '\n'.join(lines) + '\n'
+
+def bench_ai_analysis(workdir, llm_latency=0.05):
+    """Run the analysis pipeline twice with a fake model: cold, then served from the LLM cache"""
+    def respond(messages):
+        prompt = messages[0]['content']
+        if 'deployment risk' in prompt:
+            return json.dumps({'strategy': 'CANARY', 'risk_mitigation': [], 'monitoring_focus': [],
+                               'rollback_threshold': 5.0})
+        if 'test results' in prompt:
+            return json.dumps({'summary': 'failures', 'failures': [], 'recommendations': [], 'health_score': 6})
+        if 'diff' in prompt:
+            return json.dumps({'summary': 'changes', 'risk_level': 'MEDIUM', 'risky_areas': [],
+                               'testing_focus': []})
+        return 'Deployment report'
+    
+    diff_path = os.path.join(workdir, 'pr.diff')
+    log_path = os.path.join(workdir, 'test.log')
+    with open(diff_path, 'w') as f:
+        f.write(synthetic_diff())
+    with open(log_path, 'w') as f:
+        f.write(synthetic_test_log())
+    
+    fake_openai = FakeOpenAI(responder=respond, latency=llm_latency)
+    llm_cache = LLMCache(os.path.join(workdir, 'llm-cache.db'))
+    with patched(ai_analysis, 'openai', fake_openai), quiet():
+        analyzer = ai_analysis.AIAnalyzer('bench', metric_store=MetricStore(':memory:'), llm_cache=llm_cache)
+        analyzer.cloudwatch = FakeCloudWatch()
+        metrics = {'error_rate': 0.5, 'avg_latency': 120, 'cpu_usage': 40, 'memory_usage': 55}
+        
+        start = time.perf_counter()
+        cold = analyzer.run_pipeline(diff_path, 'src/', log_path, 'bench-tag', metrics=metrics)
+        cold_seconds = time.perf_counter() - start
+        cold_calls = len(fake_openai.calls)
+        
+        start = time.perf_counter()
+        analyzer.run_pipeline(diff_path, 'src/', log_path, 'bench-tag', metrics=metrics)
+        cached_seconds = time.perf_counter() - start
+    llm_cache.close()
+    
+    return {
+        'pipeline_seconds': round(cold_seconds, 3),
+        'cached_pipeline_seconds': round(cached_seconds, 3),
+        'llm_calls': cold_calls,
+        'cached_llm_calls': len(fake_openai.calls) - cold_calls,
+        'slowest_stage': max((stage for stage in cold['timings'] if stage != 'total'), key=cold['timings'].get)
+    }
+
+def bench_health_check(load_seconds=2):
+    """Health checks and a short load test against a local app with 5ms responses"""
+    app = FakeWebApp(delay=0.005)
+    checker = HealthChecker(app.url)
+    with quiet():
+        start = time.perf_counter()
+        health = checker.run_health_checks()
+        health_seconds = time.perf_counter() - start
+        load = checker.run_load_test(duration=load_seconds, concurrency=8)
+    checker.close()
+    app.close()
+    
+    return {
+        'health_check_seconds': round(health_seconds, 3),
+        'healthy': health['overall_success'],
+        'load_test_rps': round(load['throughput'], 1),
+        'load_test_p99_ms': round(load['latency']['p99'], 2),
+        'load_test_errors': load['errors']
+    }
+
+def bench_setup_monitoring(environments=24):
+    """Provision a manifest of environments against throttling fake CloudWatch, then re-run it unchanged"""
+    regions = ['us-east-1', 'eu-west-1', 'ap-south-1']
+    manifest = [{'name': f'env-{index}', 'region': regions[index % len(regions)], 'cluster': 'cartoon-cluster',
+                 'service': f'service-{index}', 'alb': f'alb-{index}', 'sns_topic_arn': 'arn:aws:sns:bench',
+                 'name_prefix': f'CartoonAnimationWeb-env-{index}'} for index in range(environments)]
+    clients = {region: FakeCloudWatch(latency=0.02, max_in_flight=3) for region in regions}
+    
+    with quiet():
+        start = time.perf_counter()
+        first = setup_monitoring.provision_environments(manifest, clients=clients, per_region=3)
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        rerun = setup_monitoring.provision_environments(manifest, clients=clients, per_region=3)
+        rerun_seconds = time.perf_counter() - start
+    
+    return {
+        'environments': environments,
+        'first_run_seconds': round(first_seconds, 3),
+        'first_run_api_calls': sum(result['api_calls'] for result in first),
+        'noop_run_seconds': round(rerun_seconds, 3),
+        'noop_run_api_calls': sum(result['api_calls'] for result in rerun),
+        'failed_environments': sum(1 for result in first + rerun if result['status'] not in ('ok', 'planned'))
+    }
+
+def run_suite():
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, trace in load_traces().items():
+            results[f'monitor_deployment/{name}'] = measured(bench_monitor, trace, workdir)
+        results['ai_analysis/pipeline'] = measured(bench_ai_analysis, workdir)
+    results['health_check/local_app'] = measured(bench_health_check)
+    results['setup_monitoring/manifest'] = measured(bench_setup_monitoring)
+    return results
+
+def regressions(results, baseline):
+    """Metrics that got worse than the baseline by more than their tolerance"""
+    found = []
+    for scenario, metrics in baseline.items():
+        for metric, expected in metrics.items():
+            actual = results.get(scenario, {}).get(metric)
+            suffix = next((s for s in TOLERANCES if metric.endswith(s)), None)
+            if suffix is None or not isinstance(expected, (int, float)) or isinstance(expected, bool):
+                if actual != expected:
+                    found.append(f"{scenario} {metric}: {actual} (baseline {expected})")
+                continue
+            if actual is None:
+                found.append(f"{scenario} {metric}: missing (baseline {expected})")
+                continue
+            
+            tolerance = TOLERANCES[suffix]
+            if suffix in HIGHER_IS_BETTER:
+                worse = actual < expected * (1 - tolerance)
+            else:
+                worse = actual > expected * (1 + tolerance) + ABSOLUTE_SLACK.get(suffix, 0)
+            if worse:
+                found.append(f"{scenario} {metric}: {actual} (baseline {expected}, tolerance {tolerance:.0%})")
+    return found
+
+def main():
+    # Usage: python3 bench_suite.py [--update-baseline] [--record-traces]
+    if '--record-traces' in sys.argv:
+        record_traces()
+    
+    results = run_suite()
+    if '--update-baseline' in sys.argv:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    
+    with open(BASELINE_PATH, 'r') as f:
+        baseline = json.load(f)
+    found = regressions(results, baseline)
+    
+    print(json.dumps({'results': results, 'regressions': found}, indent=2))
+    for regression in found:
+        print(f"❌ {regression}")
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
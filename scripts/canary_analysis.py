@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Statistical comparison of a canary target group against the baseline serving alongside it
+"""
+
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from cloudwatch_metrics import get_metric_data_incremental, metric_query
+from lazy_loading import aws_client, lazy_attribute
+from metric_store import MetricStore
+
+PROMOTE = 'PROMOTE'
+HOLD = 'HOLD'
+ROLLBACK = 'ROLLBACK'
+
+# Per-minute ALB statistics fetched for each target group
+CANARY_METRICS = [
+    ('requests', 'RequestCount', 'Sum'),
+    ('errors', 'HTTPCode_Target_5XX_Count', 'Sum'),
+    ('latency', 'TargetResponseTime', 'Average'),
+    ('latency_p99', 'TargetResponseTime', 'p99')
+]
+LATENCY_CHECKS = ['latency', 'latency_p99']
+# Exact Mann-Whitney p-values are used up to this many samples per group without ties
+EXACT_MAX_SAMPLES = 25
+
+def u_distribution(m, n):
+    """Probability of each U value for groups of m and n samples under the null hypothesis"""
+    # counts[i][j][u]: orderings of i first-group and j second-group values with U = u
+    counts = [[None] * (n + 1) for _ in range(m + 1)]
+    for i in range(m + 1):
+        for j in range(n + 1):
+            row = np.zeros(i * j + 1)
+            if i == 0 or j == 0:
+                row[0] = 1.0
+            else:
+                # The largest value is either from the second group, above all i others, or from the first
+                above = counts[i][j - 1]
+                row[i:i + len(above)] += above
+                below = counts[i - 1][j]
+                row[:len(below)] += below
+            counts[i][j] = row
+    return counts[m][n] / counts[m][n].sum()
+
+def mann_whitney_greater(first, second):
+    """One-sided Mann-Whitney U test that second tends to be larger than first; returns (U, p-value)"""
+    x = np.asarray(first, dtype=float)
+    y = np.asarray(second, dtype=float)
+    m, n = len(x), len(y)
+    if m == 0 or n == 0:
+        return 0.0, 1.0
+    
+    values = np.concatenate([x, y])
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    # Average rank of each distinct value, so ties share a rank
+    average_rank = np.cumsum(counts) - (counts - 1) / 2
+    ranks = average_rank[inverse]
+    u = float(ranks[m:].sum() - n * (n + 1) / 2)
+    
+    if counts.max() == 1 and max(m, n) <= EXACT_MAX_SAMPLES:
+        return u, float(u_distribution(m, n)[int(round(u)):].sum())
+    
+    # Normal approximation with tie correction and continuity correction
+    tie_term = float((counts ** 3 - counts).sum()) / ((m + n) * (m + n - 1))
+    variance = m * n / 12 * ((m + n + 1) - tie_term)
+    if variance <= 0:
+        return u, 1.0
+    z = (u - m * n / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+def error_rate_sprt(baseline_errors, baseline_requests, canary_errors, canary_requests,
+                    increase=1.0, min_delta=0.002, alpha=0.05, beta=0.1, truncated=False):
+    """Wald sequential probability ratio test of the canary error rate against the baseline's"""
+    # H0: the canary fails as often as the baseline; H1: it fails (1 + increase) times as often,
+    # and at least min_delta more. The log-likelihood ratio is re-evaluated on every request
+    # served so far, so a clearly bad canary is decided after a few hundred requests.
+    p0 = min(max((baseline_errors + 0.5) / (baseline_requests + 1), 1e-4), 0.5)
+    p1 = min(max(p0 * (1 + increase), p0 + min_delta), 0.99)
+    llr = (canary_errors * math.log(p1 / p0)
+           + (canary_requests - canary_errors) * math.log((1 - p1) / (1 - p0)))
+    upper = math.log((1 - beta) / alpha)
+    lower = math.log(beta / (1 - alpha))
+    
+    if llr >= upper:
+        outcome = 'fail'
+    elif llr <= lower or (truncated and llr < 0):
+        # Once the test is truncated, evidence leaning towards H0 is accepted
+        outcome = 'pass'
+    else:
+        outcome = 'pending'
+    # Posterior probability of the hypothesis the evidence favours, from even prior odds
+    confidence = 1 / (1 + math.exp(-abs(max(min(llr, 50), -50))))
+    return {
+        'check': 'error_rate',
+        'outcome': outcome,
+        'confidence': round(confidence, 4),
+        'baseline_rate': baseline_errors / baseline_requests if baseline_requests else 0.0,
+        'canary_rate': canary_errors / canary_requests if canary_requests else 0.0,
+        'canary_requests': int(canary_requests),
+        'llr': round(llr, 3),
+        'bounds': [round(lower, 3), round(upper, 3)]
+    }
+
+def latency_check(name, baseline, canary, tolerance=0.1, alpha=0.05, min_windows=3, truncated=False):
+    """Mann-Whitney tests of per-minute latency: worse than tolerance allows, or clearly within it"""
+    allowed = np.asarray(baseline, dtype=float) * (1 + tolerance)
+    _, p_worse = mann_whitney_greater(allowed, canary)
+    _, p_within = mann_whitney_greater(canary, allowed)
+    
+    if p_worse < alpha:
+        outcome, confidence = 'fail', 1 - p_worse
+    elif (p_within < alpha or truncated) and len(canary) >= min_windows:
+        # Truncated: a full comparison window without evidence of being worse is a pass
+        outcome, confidence = 'pass', max(1 - p_within, p_worse)
+    else:
+        outcome, confidence = 'pending', 1 - min(p_worse, p_within)
+    return {
+        'check': name,
+        'outcome': outcome,
+        'confidence': round(confidence, 4),
+        'baseline_median': float(np.median(baseline)) if len(baseline) else None,
+        'canary_median': float(np.median(canary)) if len(canary) else None,
+        'windows': len(canary),
+        'p_worse': round(p_worse, 5),
+        'p_within': round(p_within, 5)
+    }
+
+def canary_verdict(samples, alpha=0.05, beta=0.1, latency_tolerance=0.1, error_increase=1.0,
+                   min_error_delta=0.002, min_windows=3, max_windows=10, min_requests=200):
+    """PROMOTE, HOLD or ROLLBACK from aligned per-minute samples of both target groups"""
+    # Every check may stop early; after max_windows minutes they are truncated so a canary
+    # that is merely not worse is promoted instead of held forever
+    baseline, canary = samples['baseline'], samples['canary']
+    truncated = len(samples['timestamps']) >= max_windows
+    checks = [error_rate_sprt(baseline['errors'].sum(), baseline['requests'].sum(),
+                              canary['errors'].sum(), canary['requests'].sum(),
+                              error_increase, min_error_delta, alpha, beta, truncated)]
+    # Bonferroni: the latency checks share the false-alarm budget
+    for name in LATENCY_CHECKS:
+        checks.append(latency_check(name, baseline[name], canary[name], latency_tolerance,
+                                    alpha / len(LATENCY_CHECKS), min_windows, truncated))
+    
+    failed = [check for check in checks if check['outcome'] == 'fail']
+    if failed:
+        verdict = ROLLBACK
+        confidence = max(check['confidence'] for check in failed)
+    elif all(check['outcome'] == 'pass' for check in checks) and canary['requests'].sum() >= min_requests:
+        verdict = PROMOTE
+        confidence = min(check['confidence'] for check in checks)
+    else:
+        verdict = HOLD
+        confidence = min(check['confidence'] for check in checks)
+    
+    return {
+        'verdict': verdict,
+        'confidence': round(confidence, 4),
+        'windows': len(samples['timestamps']),
+        'checks': checks,
+        'reasons': [f"{check['check']} worse on the canary" for check in failed]
+    }
+
+class CanaryAnalyzer:
+    """Compares the canary target group of a load balancer with the baseline one, minute by minute"""
+    def __init__(self, load_balancer, baseline_target_group, canary_target_group, started=None,
+                 cloudwatch=None, metric_store=None, period=60, **criteria):
+        self.load_balancer = load_balancer
+        self.target_groups = {'baseline': baseline_target_group, 'canary': canary_target_group}
+        # Only minutes since the canary started taking traffic are compared
+        self.started = started or datetime.utcnow()
+        self.period = period
+        self.criteria = criteria
+        if cloudwatch is not None:
+            self.cloudwatch = cloudwatch
+        self.metric_store = metric_store or MetricStore()
+    
+    @lazy_attribute
+    def cloudwatch(self):
+        return aws_client('cloudwatch')
+    
+    def queries(self):
+        queries = []
+        for group, target_group in self.target_groups.items():
+            dimensions = [{'Name': 'LoadBalancer', 'Value': self.load_balancer},
+                          {'Name': 'TargetGroup', 'Value': target_group}]
+            for name, metric_name, stat in CANARY_METRICS:
+                queries.append(metric_query(f'{group}_{name}', 'AWS/ApplicationELB', metric_name,
+                                            dimensions, stat, self.period))
+        return queries
+    
+    def fetch_samples(self, end_time=None):
+        """Per-minute metrics of both target groups, for the minutes in which both served traffic"""
+        end_time = end_time or datetime.utcnow()
+        series = get_metric_data_incremental(self.cloudwatch, self.metric_store, self.queries(),
+                                             self.started, end_time)
+        
+        by_minute = {}
+        for query_id, points in series.items():
+            for timestamp, value in points:
+                by_minute.setdefault(timestamp, {})[query_id] = value
+        # A minute without requests has no latency datapoint; errors are simply absent when zero
+        timestamps = sorted(t for t, values in by_minute.items()
+                            if values.get('baseline_requests') and values.get('canary_requests'))
+        
+        samples = {'timestamps': timestamps}
+        for group in self.target_groups:
+            samples[group] = {
+                name: np.array([by_minute[t].get(f'{group}_{name}', 0.0) for t in timestamps])
+                for name, _, _ in CANARY_METRICS
+            }
+        return samples
+    
+    def analyze(self, end_time=None):
+        return canary_verdict(self.fetch_samples(end_time), **self.criteria)
+    
+    def watch(self, max_minutes=15, interval=60):
+        """Re-analyze every interval until a PROMOTE or ROLLBACK verdict, or HOLD after max_minutes"""
+        deadline = time.monotonic() + max_minutes * 60
+        while True:
+            result = self.analyze()
+            print(f"[{datetime.utcnow()}] {result['verdict']} (confidence {result['confidence']:.2f}, "
+                  f"{result['windows']} minutes compared)")
+            if result['verdict'] != HOLD or time.monotonic() + interval > deadline:
+                return result
+            time.sleep(interval)
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python3 canary_analysis.py <load_balancer> <baseline_target_group> <canary_target_group> "
+              "[max_minutes] [started_minutes_ago]")
+        print("  load_balancer / target groups: CloudWatch dimension values (app/..., targetgroup/...)")
+        print("  max_minutes: Keep analyzing while the verdict is HOLD for up to this long (default: 15)")
+        print("  started_minutes_ago: When the canary began taking traffic (default: now)")
+        print("  Exit code: 0 PROMOTE, 1 ROLLBACK, 2 HOLD")
+        sys.exit(1)
+    
+    max_minutes = float(sys.argv[4]) if len(sys.argv) > 4 else 15
+    started = datetime.utcnow() - timedelta(minutes=float(sys.argv[5]) if len(sys.argv) > 5 else 0)
+    region = os.getenv('AWS_DEFAULT_REGION')
+    
+    analyzer = CanaryAnalyzer(sys.argv[1], sys.argv[2], sys.argv[3], started=started,
+                              cloudwatch=aws_client('cloudwatch', region))
+    result = analyzer.watch(max_minutes)
+    print(json.dumps(result, indent=2))
+    sys.exit({PROMOTE: 0, ROLLBACK: 1, HOLD: 2}[result['verdict']])
+
+if __name__ == "__main__":
+    main()
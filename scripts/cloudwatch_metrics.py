@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Batched CloudWatch metric retrieval with GetMetricData
+"""
+
+from datetime import timedelta
+from metric_store import series_cache_key
+
+# GetMetricData accepts at most this many queries per request
+MAX_QUERIES_PER_REQUEST = 500
+# Newest periods left unsettled, since CloudWatch may still add late datapoints to them
+UNSETTLED_PERIODS = 3
+
+def metric_query(query_id, namespace, metric_name, dimensions, stat, period):
+    """Build a GetMetricData query for a single metric statistic"""
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': namespace,
+                'MetricName': metric_name,
+                'Dimensions': dimensions
+            },
+            'Period': period,
+            'Stat': stat
+        },
+        'ReturnData': True
+    }
+
+def get_metric_data(cloudwatch, queries, start_time, end_time):
+    """Fetch every query in as few GetMetricData calls as possible, following NextToken pagination"""
+    # {query_id: [(timestamp, value), ...]}, each series sorted oldest first
+    series = {query['Id']: [] for query in queries}
+    
+    for offset in range(0, len(queries), MAX_QUERIES_PER_REQUEST):
+        request = {
+            'MetricDataQueries': queries[offset:offset + MAX_QUERIES_PER_REQUEST],
+            'StartTime': start_time,
+            'EndTime': end_time,
+            'ScanBy': 'TimestampAscending'
+        }
+        
+        while True:
+            response = cloudwatch.get_metric_data(**request)
+            for result in response['MetricDataResults']:
+                series[result['Id']].extend(zip(result['Timestamps'], result['Values']))
+            
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            request['NextToken'] = next_token
+    
+    for points in series.values():
+        points.sort(key=lambda point: point[0])
+    return series
+
+def get_metric_data_incremental(cloudwatch, store, queries, start_time, end_time):
+    """Fetch only datapoints missing from the local store, then read the whole window from it"""
+    if store is None:
+        return get_metric_data(cloudwatch, queries, start_time, end_time)
+    
+    keys = {query['Id']: series_cache_key(query) for query in queries}
+    fetch_from = {}
+    for query in queries:
+        missing_from = store.missing_from(keys[query['Id']], start_time, end_time)
+        if missing_from is not None:
+            fetch_from[query['Id']] = missing_from
+    
+    if fetch_from:
+        # One batched request from the earliest gap; the newest periods stay unsettled
+        stale = [query for query in queries if query['Id'] in fetch_from]
+        fetch_start = min(fetch_from.values())
+        fetched = get_metric_data(cloudwatch, stale, fetch_start, end_time)
+        for query in stale:
+            settled_until = end_time - timedelta(seconds=UNSETTLED_PERIODS * query['MetricStat']['Period'])
+            store.append(keys[query['Id']], fetched[query['Id']], fetch_start, settled_until)
+    
+    return {query['Id']: store.query(keys[query['Id']], start_time, end_time) for query in queries}
+
+def latest_value(points, default=0):
+    """Most recent value of a sorted series"""
+    return points[-1][1] if points else default
+
+def latest_complete(points, period, end_time):
+    """Newest (timestamp, value) of a sorted series whose period had ended by end_time, or None"""
+    # The newest period is still being aggregated: its Sums are short and its percentiles
+    # come from a partial sample
+    cutoff = end_time - timedelta(seconds=period)
+    for timestamp, value in reversed(points):
+        if timestamp <= cutoff:
+            return timestamp, value
+    return None
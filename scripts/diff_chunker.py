@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Streaming unified-diff splitter for chunked PR analysis
+"""
+
+import os
+
+LOCKFILES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml',
+    'Cargo.lock', 'Gemfile.lock', 'poetry.lock', 'Pipfile.lock', 'composer.lock', 'go.sum'
+}
+BINARY_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico', '.bmp', '.svgz', '.pdf',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot', '.mp3', '.mp4', '.webm', '.zip', '.gz', '.br'
+}
+
+def estimate_tokens(text):
+    """Rough GPT token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def skip_reason(path):
+    """Why a file's diff is summarized instead of analyzed, or None"""
+    name = os.path.basename(path)
+    if name in LOCKFILES:
+        return 'lockfile'
+    if os.path.splitext(name)[1].lower() in BINARY_EXTENSIONS or name.endswith('.min.js'):
+        return 'binary'
+    return None
+
+class DiffChunker:
+    """Splits a unified diff into prompt-sized chunks while reading it line by line"""
+    # Only the chunk being filled is held in memory; lockfiles, binaries and any
+    # files past max_chunks are reduced to line counts.
+    def __init__(self, token_budget=3000, max_chunks=12, max_line_length=500):
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.max_line_length = max_line_length
+        self.skipped = []
+        self.omitted = []
+    
+    def chunks(self, lines):
+        """Yield chunk texts, each at most token_budget tokens, in diff order"""
+        self.skipped = []
+        self.omitted = []
+        chunk, chunk_tokens, emitted = [], 0, 0
+        
+        for path, header, body in self.files(lines):
+            reason = skip_reason(path)
+            if reason:
+                self.skipped.append(self.file_stats(path, body, reason=reason))
+                continue
+            if emitted >= self.max_chunks:
+                self.omitted.append(self.file_stats(path, body))
+                continue
+            
+            continued = False
+            for piece in self.pieces(header, body):
+                # A file too large for one chunk carries its header into each continuation
+                if continued:
+                    piece = f"{header[0] if header else path} (continued)\n" + piece
+                continued = True
+                
+                tokens = estimate_tokens(piece)
+                if chunk and chunk_tokens + tokens > self.token_budget:
+                    yield ''.join(chunk)
+                    emitted += 1
+                    chunk, chunk_tokens = [], 0
+                    if emitted >= self.max_chunks:
+                        break
+                chunk.append(piece)
+                chunk_tokens += tokens
+            
+            if emitted >= self.max_chunks:
+                # Lines of this file that did not fit are consumed and counted
+                self.omitted.append(self.file_stats(path, body))
+        
+        if chunk and emitted < self.max_chunks:
+            yield ''.join(chunk)
+    
+    def files(self, lines):
+        """Yield (path, header lines, body line iterator) per file; each body must be consumed in order"""
+        lines = iter(lines)
+        pending = next(lines, None)
+        while pending is not None:
+            if pending.startswith('diff --git '):
+                header = [pending.rstrip('\n')]
+                path = header[0].rsplit(' b/', 1)[-1]
+                first = []
+            else:
+                # Diff without git file headers, e.g. plain `diff -u` output
+                header, path, first = [], '(diff)', [pending]
+            state = {'next': None}
+            
+            def body(first=first, state=state):
+                yield from first
+                for line in lines:
+                    if line.startswith('diff --git '):
+                        state['next'] = line
+                        return
+                    yield line
+            
+            body_lines = body()
+            yield path, header, body_lines
+            for _ in body_lines:
+                pass
+            pending = state['next']
+    
+    def pieces(self, header, body):
+        """Text of one file split into pieces under the token budget, at hunk boundaries where possible"""
+        # Leave room for the continuation header added by chunks()
+        limit = self.token_budget * 4 - 200
+        piece = [line + '\n' for line in header]
+        size = sum(len(line) for line in piece)
+        
+        for line in body:
+            if line.startswith('GIT binary patch'):
+                # Base85 payload of a binary file git could not recognise by extension
+                piece.append('GIT binary patch [omitted]\n')
+                for _ in body:
+                    pass
+                break
+            if len(line) > self.max_line_length:
+                line = line[:self.max_line_length] + ' [line truncated]\n'
+            if piece and (size + len(line) > limit or (line.startswith('@@') and size > limit * 0.75)):
+                yield ''.join(piece)
+                piece, size = [], 0
+            piece.append(line)
+            size += len(line)
+        
+        if piece:
+            yield ''.join(piece)
+    
+    def file_stats(self, path, body, reason='omitted'):
+        """Added/removed line counts of a file whose content is not sent to the model"""
+        added = removed = 0
+        binary = False
+        for line in body:
+            if line.startswith('+') and not line.startswith('+++'):
+                added += 1
+            elif line.startswith('-') and not line.startswith('---'):
+                removed += 1
+            elif line.startswith('Binary files') or line.startswith('GIT binary patch'):
+                binary = True
+        return {'path': path, 'reason': 'binary' if binary else reason, 'added': added, 'removed': removed}
+    
+    def notes(self, limit=40):
+        """One line per file that was summarized instead of analyzed, up to limit lines"""
+        files = self.skipped + self.omitted
+        notes = [f"{f['path']} ({f['reason']}, +{f['added']}/-{f['removed']} lines)" for f in files[:limit]]
+        if len(files) > limit:
+            notes.append(f"... and {len(files) - limit} more files")
+        return notes
@@ -3,55 +3,144 @@
 Health check script for the deployed application
 """
 
+import os
 import requests
 import sys
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, NewConnectionError, TimeoutError as Urllib3TimeoutError
+from urllib3.util.retry import Retry
+from latency_stats import LatencyHistogram, RollingWindow
+from page_probe import PAGE_BUDGET_KB, PAGE_BUDGET_MS, PageProbe, budget_failures
+
+# Connection setup time of the most recent request made on this thread
+_connect_timing = threading.local()
+
+def is_timeout(error):
+    """Whether a requests error is a timeout, including read timeouts retried to exhaustion"""
+    # With a Retry policy requests reports an exhausted read timeout as a ConnectionError
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # NewConnectionError (e.g. connection refused) subclasses the timeout errors for compatibility
+    return (isinstance(reason, MaxRetryError) and isinstance(reason.reason, Urllib3TimeoutError)
+            and not isinstance(reason.reason, NewConnectionError))
+
+class TimedHTTPConnection(HTTPConnection):
+    """HTTP connection that records DNS + TCP connect time"""
+    def connect(self):
+        start_time = time.perf_counter()
+        super().connect()
+        _connect_timing.connect_time = (time.perf_counter() - start_time) * 1000
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records DNS + TCP + TLS handshake time"""
+    def connect(self):
+        start_time = time.perf_counter()
+        super().connect()
+        _connect_timing.connect_time = (time.perf_counter() - start_time) * 1000
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Keep-alive adapter whose pools time new connections"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool
+        }
 
 class HealthChecker:
-    def __init__(self, base_url, timeout=10):
+    def __init__(self, base_url, timeout=10, max_concurrency=4, pool_size=10, retries=0):
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
+        self.max_concurrency = max_concurrency
         self.endpoints = [
             '/',
             '/health',
             '/api/health'
         ]
+        self.session = self.create_session(pool_size, retries)
+    
+    def create_session(self, pool_size, retries):
+        """Create a pooled keep-alive session shared by all probes"""
+        # No retries by default: a retried probe can pass a flaky endpoint and take several timeouts
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=0,
+            backoff_factor=0.2,
+            allowed_methods=['GET', 'HEAD']
+        )
+        adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
     
-    def check_endpoint(self, endpoint):
+    def check_endpoint(self, endpoint, session=None):
         """Check a specific endpoint"""
         url = f"{self.base_url}{endpoint}"
+        session = session or self.session
+        start_time = time.perf_counter()
         try:
-            start_time = time.time()
-            response = requests.get(url, timeout=self.timeout)
-            response_time = (time.time() - start_time) * 1000  # Convert to ms
+            _connect_timing.connect_time = None
+            with session.get(url, timeout=self.timeout, stream=True) as response:
+                ttfb = (time.perf_counter() - start_time) * 1000  # Headers received
+                response.content  # Read the body so the connection returns to the pool
+            response_time = (time.perf_counter() - start_time) * 1000  # Convert to ms
+            
+            # No connect recorded means the request went out on a kept-alive connection
+            connect_time = _connect_timing.connect_time
+            connection_reused = connect_time is None
+            connect_time = connect_time or 0.0
             
             return {
                 'endpoint': endpoint,
                 'status_code': response.status_code,
                 'response_time': response_time,
+                'connect_time': connect_time,
+                'ttfb': ttfb,
+                'server_time': max(ttfb - connect_time, 0.0),
+                'connection_reused': connection_reused,
                 'success': 200 <= response.status_code < 400,
                 'timestamp': datetime.utcnow().isoformat()
             }
-        except requests.exceptions.Timeout:
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if not is_timeout(e):
+                return {
+                    'endpoint': endpoint,
+                    'status_code': None,
+                    'response_time': None,
+                    'success': False,
+                    'error': 'Connection Error',
+                    'timestamp': datetime.utcnow().isoformat()
+                }
             return {
                 'endpoint': endpoint,
                 'status_code': None,
-                'response_time': self.timeout * 1000,
+                # Measured, since retries can make a timed-out probe take several timeouts
+                'response_time': (time.perf_counter() - start_time) * 1000,
                 'success': False,
                 'error': 'Timeout',
                 'timestamp': datetime.utcnow().isoformat()
             }
-        except requests.exceptions.ConnectionError:
-            return {
-                'endpoint': endpoint,
-                'status_code': None,
-                'response_time': None,
-                'success': False,
-                'error': 'Connection Error',
-                'timestamp': datetime.utcnow().isoformat()
-            }
         except Exception as e:
             return {
                 'endpoint': endpoint,
@@ -62,20 +151,30 @@ class HealthChecker:
                 'timestamp': datetime.utcnow().isoformat()
             }
     
+    def probe_endpoints(self):
+        """Check all endpoints concurrently, returning results in endpoint order"""
+        workers = max(1, min(self.max_concurrency, len(self.endpoints)))
+        if workers == 1:
+            return [self.check_endpoint(endpoint) for endpoint in self.endpoints]
+        
+        # Wall time is bounded by the slowest endpoint instead of the sum of all of them
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.check_endpoint, self.endpoints))
+    
     def run_health_checks(self):
         """Run all health checks"""
-        results = []
         overall_success = True
         
         print(f"🔍 Running health checks for {self.base_url}")
         print("-" * 50)
         
-        for endpoint in self.endpoints:
-            result = self.check_endpoint(endpoint)
-            results.append(result)
+        results = self.probe_endpoints()
+        for result in results:
+            endpoint = result['endpoint']
             
             if result['success']:
-                print(f"✅ {endpoint}: {result['status_code']} ({result['response_time']:.2f}ms)")
+                print(f"✅ {endpoint}: {result['status_code']} ({result['response_time']:.2f}ms, "
+                      f"connect {result['connect_time']:.2f}ms, ttfb {result['ttfb']:.2f}ms)")
             else:
                 print(f"❌ {endpoint}: {result.get('error', result['status_code'])}")
                 overall_success = False
@@ -100,64 +199,309 @@ class HealthChecker:
             'timestamp': datetime.utcnow().isoformat()
         }
     
-    def continuous_monitoring(self, interval=60, duration=300):
-        """Run continuous health monitoring"""
-        print(f"🔄 Starting continuous monitoring for {duration} seconds (checking every {interval}s)")
+    def run_load_test(self, duration=30, concurrency=10, rate=None):
+        """Drive load against all endpoints and report throughput and latency percentiles"""
+        mode = f"{rate} req/s" if rate else "closed loop"
+        print(f"🏋️  Load testing {self.base_url} for {duration}s ({concurrency} workers, {mode})")
+        print("-" * 50)
+        
+        # Dedicated pool sized for the workers, without retries hiding failures
+        session = self.create_session(concurrency, retries=0)
+        histograms = {endpoint: LatencyHistogram() for endpoint in self.endpoints}
+        requests_sent = {endpoint: 0 for endpoint in self.endpoints}
+        errors = {endpoint: 0 for endpoint in self.endpoints}
+        lock = threading.Lock()
+        sequence = [0]
+        start_time = time.perf_counter()
+        deadline = start_time + duration
+        
+        def worker():
+            while True:
+                with lock:
+                    request_number = sequence[0]
+                    sequence[0] += 1
+                
+                # Open loop: each request has a scheduled send time, and latency is
+                # measured from it so a stalled server cannot hide queueing delay
+                scheduled = start_time + request_number / rate if rate else time.perf_counter()
+                if scheduled >= deadline or time.perf_counter() >= deadline:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                
+                endpoint = self.endpoints[request_number % len(self.endpoints)]
+                result = self.check_endpoint(endpoint, session)
+                latency = (time.perf_counter() - scheduled) * 1000
+                
+                with lock:
+                    requests_sent[endpoint] += 1
+                    # Timeouts count at their elapsed time, so an overloaded server that times
+                    # out cannot report a healthy tail; instant connection refusals are only errors
+                    if result['status_code'] is not None or result.get('error') == 'Timeout':
+                        histograms[endpoint].record(latency)
+                    if not result['success']:
+                        errors[endpoint] += 1
+        
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for _ in range(concurrency):
+                    executor.submit(worker)
+        except KeyboardInterrupt:
+            print("\n🛑 Load test stopped by user")
+        finally:
+            session.close()
+        
+        elapsed = time.perf_counter() - start_time
+        overall = LatencyHistogram()
+        endpoint_stats = {}
+        for endpoint in self.endpoints:
+            overall.merge(histograms[endpoint])
+            endpoint_stats[endpoint] = dict(
+                histograms[endpoint].summary(),
+                requests=requests_sent[endpoint],
+                errors=errors[endpoint]
+            )
+        
+        total_requests = sum(requests_sent.values())
+        total_errors = sum(errors.values())
+        
+        for endpoint, stats in endpoint_stats.items():
+            print(f"   {endpoint}: {stats['requests']} requests, {stats['errors']} errors | "
+                  f"p50 {stats['p50']:.2f}ms p90 {stats['p90']:.2f}ms "
+                  f"p99 {stats['p99']:.2f}ms max {stats['max']:.2f}ms")
+        
+        summary = overall.summary()
+        throughput = total_requests / elapsed if elapsed else 0.0
+        print("-" * 50)
+        print(f"📊 Load Test Summary:")
+        print(f"   Requests: {total_requests} in {elapsed:.1f}s ({throughput:.1f} req/s)")
+        print(f"   Errors: {total_errors} ({total_errors/max(1, total_requests)*100:.2f}%)")
+        print(f"   Latency p50/p90/p99/max: {summary['p50']:.2f}/{summary['p90']:.2f}/"
+              f"{summary['p99']:.2f}/{summary['max']:.2f}ms")
         
+        return {
+            'duration': elapsed,
+            'concurrency': concurrency,
+            'target_rate': rate,
+            'throughput': throughput,
+            'requests': total_requests,
+            'errors': total_errors,
+            'latency': summary,
+            'endpoints': endpoint_stats,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    def run_page_probe(self, max_kb=PAGE_BUDGET_KB, max_ms=PAGE_BUDGET_MS):
+        """Load the page with every asset it references and check it against the budgets"""
+        print(f"🌐 Loading {self.base_url} with its full asset graph")
+        print("-" * 50)
+        
+        summary = PageProbe(self.base_url, self.session, self.timeout).run()
+        for asset in summary['assets']:
+            status = '✅' if asset['success'] else '❌'
+            encoding = f", {asset['content_encoding']}" if asset.get('content_encoding') else ""
+            print(f"{status} {asset['url']} [{asset['kind']}] {asset['bytes'] / 1024:.1f}KB{encoding} "
+                  f"{asset['start_ms']:.0f}-{asset['end_ms']:.0f}ms {asset.get('error', '')}")
+            for issue in asset['issues']:
+                print(f"   ⚠️  {issue}")
+        
+        print("-" * 50)
+        print(f"📊 Page Load Summary:")
+        print(f"   Requests: {summary['requests']}, {summary['bytes'] / 1024:.0f}KB transferred "
+              f"({summary['decoded_bytes'] / 1024:.0f}KB decoded)")
+        print(f"   Load time: {summary['load_ms']:.0f}ms")
+        for kind, stats in sorted(summary['by_kind'].items()):
+            print(f"   {kind}: {stats['requests']} requests, {stats['bytes'] / 1024:.0f}KB")
+        print(f"   Critical path:")
+        for step in summary['critical_path']:
+            print(f"     {step['start_ms']:.0f}-{step['end_ms']:.0f}ms {step['url']}")
+        
+        summary['budget_failures'] = budget_failures(summary, max_kb, max_ms)
+        for failure in summary['budget_failures']:
+            print(f"❌ {failure}")
+        summary['overall_success'] = not summary['budget_failures']
+        return summary
+    
+    def iter_health_checks(self, interval=60, duration=300):
+        """Yield health check results every interval until duration has elapsed"""
         start_time = time.time()
         check_count = 0
-        all_results = []
+        
+        while time.time() - start_time < duration:
+            check_count += 1
+            print(f"\n--- Health Check #{check_count} ---")
+            
+            yield self.run_health_checks()
+            
+            if time.time() - start_time < duration:
+                print(f"⏳ Waiting {interval} seconds until next check...")
+                time.sleep(interval)
+    
+    def continuous_monitoring(self, interval=60, duration=300, summary_every=5, ndjson_path=None):
+        """Run continuous health monitoring with constant-memory aggregation"""
+        print(f"🔄 Starting continuous monitoring for {duration} seconds (checking every {interval}s)")
+        
+        aggregator = HealthAggregator(self.endpoints)
+        ndjson_file = None
         
         try:
-            while time.time() - start_time < duration:
-                check_count += 1
-                print(f"\n--- Health Check #{check_count} ---")
-                
-                result = self.run_health_checks()
-                all_results.append(result)
+            ndjson_file = open(ndjson_path, 'a') if ndjson_path else None
+            for result in self.iter_health_checks(interval, duration):
+                aggregator.add(result)
                 
                 if not result['overall_success']:
                     print("⚠️  Unhealthy status detected!")
                 
-                if time.time() - start_time < duration:
-                    print(f"⏳ Waiting {interval} seconds until next check...")
-                    time.sleep(interval)
+                if ndjson_file and aggregator.checks % summary_every == 0:
+                    ndjson_file.write(json.dumps(aggregator.summary()) + "\n")
+                    ndjson_file.flush()
         
         except KeyboardInterrupt:
             print("\n🛑 Monitoring stopped by user")
+        finally:
+            # The final aggregate is written however the loop ends, even when a check raises
+            if ndjson_file:
+                try:
+                    ndjson_file.write(json.dumps(dict(aggregator.summary(), final=True)) + "\n")
+                finally:
+                    ndjson_file.close()
         
-        # Summary
-        total_checks = len(all_results)
-        healthy_checks = sum(1 for r in all_results if r['overall_success'])
-        avg_success_rate = sum(r['success_rate'] for r in all_results) / total_checks
-        avg_response_time = sum(r['avg_response_time'] for r in all_results) / total_checks
-        
+        summary = aggregator.summary()
         print(f"\n📈 Monitoring Summary:")
-        print(f"   Total Checks: {total_checks}")
-        print(f"   Healthy Checks: {healthy_checks}")
-        print(f"   Average Success Rate: {avg_success_rate*100:.1f}%")
-        print(f"   Average Response Time: {avg_response_time:.2f}ms")
+        print(f"   Total Checks: {summary['checks']}")
+        print(f"   Healthy Checks: {summary['healthy_checks']}")
+        print(f"   Average Success Rate: {summary['avg_success_rate']*100:.1f}%")
+        print(f"   Average Response Time: {summary['avg_response_time']:.2f}ms")
+        for endpoint, stats in summary['endpoints'].items():
+            latency = stats['latency']
+            print(f"   {endpoint}: p50 {latency['p50']:.2f}ms p99 {latency['p99']:.2f}ms "
+                  f"max {latency['max']:.2f}ms, {stats['failures']} failures")
         
-        return all_results
+        return summary
+
+class HealthAggregator:
+    """Running counters, latency histograms and rolling windows over health check results"""
+    def __init__(self, endpoints, window_size=10):
+        self.checks = 0
+        self.healthy_checks = 0
+        self.success_rate_total = 0.0
+        self.response_time_total = 0.0
+        self.recent_success = RollingWindow(window_size)
+        self.recent_response_time = RollingWindow(window_size)
+        self.window_size = window_size
+        self.endpoints = {endpoint: self.new_endpoint_stats() for endpoint in endpoints}
+    
+    def new_endpoint_stats(self):
+        return {
+            'checks': 0,
+            'failures': 0,
+            'latency': LatencyHistogram(),
+            'recent': RollingWindow(self.window_size)
+        }
+    
+    def add(self, result):
+        """Fold one run_health_checks result into the aggregate"""
+        self.checks += 1
+        self.healthy_checks += 1 if result['overall_success'] else 0
+        self.success_rate_total += result['success_rate']
+        self.response_time_total += result['avg_response_time']
+        self.recent_success.add(result['success_rate'])
+        self.recent_response_time.add(result['avg_response_time'])
+        
+        for probe in result['results']:
+            if probe['endpoint'] not in self.endpoints:
+                self.endpoints[probe['endpoint']] = self.new_endpoint_stats()
+            stats = self.endpoints[probe['endpoint']]
+            stats['checks'] += 1
+            if not probe['success']:
+                stats['failures'] += 1
+            if probe['response_time'] is not None:
+                stats['latency'].record(probe['response_time'])
+                stats['recent'].add(probe['response_time'])
+    
+    def summary(self):
+        """Current aggregate as a JSON-serialisable record"""
+        checks = max(1, self.checks)
+        return {
+            'checks': self.checks,
+            'healthy_checks': self.healthy_checks,
+            'avg_success_rate': self.success_rate_total / checks,
+            'avg_response_time': self.response_time_total / checks,
+            'window': {
+                'size': len(self.recent_success),
+                'success_rate': self.recent_success.mean(),
+                'avg_response_time': self.recent_response_time.mean()
+            },
+            'endpoints': {
+                endpoint: {
+                    'checks': stats['checks'],
+                    'failures': stats['failures'],
+                    'latency': stats['latency'].summary(),
+                    'window_avg_response_time': stats['recent'].mean()
+                }
+                for endpoint, stats in self.endpoints.items()
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        }
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python3 health_check.py <base_url> [interval] [duration]")
+        print("Usage: python3 health_check.py <base_url> [interval] [duration] [concurrency] [ndjson_file]")
+        print("       python3 health_check.py <base_url> load [duration] [concurrency] [rate]")
+        print("       python3 health_check.py <base_url> page [max_kb] [max_load_ms]")
         print("  base_url: Application URL (e.g., http://example.com)")
         print("  interval: Check interval in seconds (default: 60)")
-        print("  duration: Total monitoring duration in seconds (default: 300)")
+        print("  duration: Total monitoring duration in seconds (default: 300, load: 30)")
+        print("  concurrency: Max endpoints probed in parallel, 1 = serial (default: 4, load: 10)")
+        print("  rate: Target requests per second for load mode (default: as fast as possible)")
+        print("  ndjson_file: Append periodic monitoring summaries to this file as NDJSON")
+        print("  HEALTH_CHECK_RETRIES: Connect/read retries per probe (default: 0)")
+        print(f"  page: Fetch every asset of the page; fails over max_kb transferred (default: {PAGE_BUDGET_KB})")
+        print(f"        or max_load_ms (default: {PAGE_BUDGET_MS}), or if any asset fails to load")
         sys.exit(1)
     
     base_url = sys.argv[1]
+    retries = int(os.getenv('HEALTH_CHECK_RETRIES', '0'))
+    
+    if len(sys.argv) > 2 and sys.argv[2] == 'load':
+        duration = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+        rate = float(sys.argv[5]) if len(sys.argv) > 5 else None
+        
+        checker = HealthChecker(base_url, retries=retries)
+        try:
+            result = checker.run_load_test(duration, concurrency, rate)
+        finally:
+            checker.close()
+        print(json.dumps(result))
+        return
+    
+    if len(sys.argv) > 2 and sys.argv[2] == 'page':
+        max_kb = float(sys.argv[3]) if len(sys.argv) > 3 else PAGE_BUDGET_KB
+        max_ms = float(sys.argv[4]) if len(sys.argv) > 4 else PAGE_BUDGET_MS
+        
+        checker = HealthChecker(base_url, retries=retries)
+        try:
+            result = checker.run_page_probe(max_kb, max_ms)
+        finally:
+            checker.close()
+        sys.exit(0 if result['overall_success'] else 1)
+    
     interval = int(sys.argv[2]) if len(sys.argv) > 2 else 60
     duration = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    ndjson_path = sys.argv[5] if len(sys.argv) > 5 else None
     
-    checker = HealthChecker(base_url)
+    checker = HealthChecker(base_url, max_concurrency=concurrency, retries=retries)
     
-    if duration > 0:
-        checker.continuous_monitoring(interval, duration)
-    else:
-        checker.run_health_checks()
+    try:
+        if duration > 0:
+            checker.continuous_monitoring(interval, duration, ndjson_path=ndjson_path)
+        else:
+            checker.run_health_checks()
+    finally:
+        checker.close()
 
 if __name__ == "__main__":
     main()
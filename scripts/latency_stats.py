@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Latency statistics helpers shared by the health check and load test modes
+"""
+
+import math
+from collections import deque
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in milliseconds"""
+    def __init__(self, significant_digits=2, highest_ms=3600000):
+        sub_bucket_count = 2 ** math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_bits = int(math.log2(sub_bucket_count))
+        self.sub_bucket_half = sub_bucket_count // 2
+        self.highest = int(highest_ms * 1000)
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+    
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return shift * self.sub_bucket_half + (value >> shift)
+    
+    def _highest_equivalent(self, index):
+        shift = max(0, index // self.sub_bucket_half - 1)
+        sub_bucket = index - shift * self.sub_bucket_half
+        return ((sub_bucket + 1) << shift) - 1
+    
+    def record(self, latency_ms, count=1):
+        """Record a latency sample in milliseconds"""
+        value = min(max(int(latency_ms * 1000), 0), self.highest)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def merge(self, other):
+        """Add all samples from another histogram with the same precision"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+    
+    def percentile(self, percentile):
+        """Latency in milliseconds at the given percentile (0-100)"""
+        if not self.count:
+            return 0.0
+        
+        target = max(1, math.ceil(percentile / 100.0 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max) / 1000.0
+        return self.max / 1000.0
+    
+    def mean(self):
+        """Arithmetic mean in milliseconds"""
+        return self.total / self.count / 1000.0 if self.count else 0.0
+    
+    def summary(self):
+        """Summary of the distribution in milliseconds"""
+        return {
+            'count': self.count,
+            'min': (self.min or 0) / 1000.0,
+            'mean': self.mean(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': (self.max or 0) / 1000.0
+        }
+
+class RollingWindow:
+    """Fixed-size window over the most recent values"""
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+    
+    def add(self, value):
+        """Add a value, evicting the oldest one once the window is full"""
+        self.values.append(value)
+    
+    def mean(self):
+        """Mean of the values currently in the window"""
+        return sum(self.values) / len(self.values) if self.values else 0.0
+    
+    def __len__(self):
+        return len(self.values)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Deferred imports and client construction so short CLI runs only pay for what they use
+"""
+
+import importlib
+import threading
+
+# boto3's default session is not thread-safe, so clients are created one at a time
+_client_lock = threading.Lock()
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access or assignment"""
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+    
+    def _load(self):
+        if self._module is None:
+            object.__setattr__(self, '_module', importlib.import_module(self._name))
+        return self._module
+    
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+    
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+class lazy_attribute:
+    """Method decorator turning it into an attribute computed once, on first access"""
+    # Non-data descriptor: the computed value is stored in the instance __dict__, which
+    # then shadows the descriptor, and assigning the attribute (e.g. a fake client) works.
+    # No lock is held while computing, since factories may do I/O or use other lazy
+    # attributes; if two threads race, the first stored value wins.
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance.__dict__.setdefault(self.name, self.factory(instance))
+
+def aws_client(service, region_name=None):
+    """boto3 client, importing boto3 on first use"""
+    import boto3
+    with _client_lock:
+        if region_name:
+            return boto3.client(service, region_name=region_name)
+        return boto3.client(service)
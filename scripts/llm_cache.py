@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for LLM chat completions
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join('~', '.cache', 'cartoon-animation-web', 'llm-cache.db')
+
+def cache_key(model, messages, params):
+    """SHA-256 of the model, prompt messages and sampling parameters"""
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cache_disabled():
+    """Opt-out through LLM_CACHE=off (or 0/false/no)"""
+    return os.getenv('LLM_CACHE', 'on').lower() in ('off', '0', 'false', 'no')
+
+class LLMCache:
+    """SQLite cache of completion texts with a TTL and least-recently-used eviction by size"""
+    def __init__(self, path=None, ttl_hours=168, max_bytes=50 * 1024 * 1024, enabled=None):
+        self.enabled = not cache_disabled() if enabled is None else enabled
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.lock = threading.Lock()
+        self.db = None
+        if not self.enabled:
+            return
+        
+        path = path or os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH)
+        if path != ':memory:':
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+        ''')
+        self.evict()
+    
+    def get(self, key):
+        """Cached completion text for a key, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute(
+                'SELECT content FROM responses WHERE key = ? AND created_at >= ?', (key, now - self.ttl)
+            ).fetchone()
+            if row:
+                self.db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self.stats['hits' if row else 'misses'] += 1
+        
+        return row[0] if row else None
+    
+    def put(self, key, content):
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (key, content, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, content, len(content.encode('utf-8')), now, now)
+            )
+        self.evict()
+    
+    def chat_completion(self, create, model, messages, validate=None, **params):
+        """Completion text for a prompt, calling create (openai.ChatCompletion.create) only on a miss"""
+        key = cache_key(model, messages, params)
+        content = self.get(key)
+        if content is None:
+            response = create(model=model, messages=messages, **params)
+            content = response.choices[0].message.content
+            # Responses that fail validation raise here and are not cached, so a re-run asks again
+            if validate:
+                validate(content)
+            self.put(key, content)
+        return content
+    
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_bytes"""
+        with self.lock, self.db:
+            expired = self.db.execute(
+                'DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl,)
+            ).rowcount
+            
+            total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                for key, size in self.db.execute(
+                    'SELECT key, size FROM responses ORDER BY accessed_at'
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    total -= size
+                    evicted += 1
+        self.stats['evictions'] += expired + evicted
+    
+    def report(self, stream=sys.stderr):
+        """Print hit/miss counts, on stderr by default so JSON output on stdout stays clean"""
+        if self.enabled:
+            print(f"LLM cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                  f"{self.stats['evictions']} evictions", file=stream)
+        else:
+            print("LLM cache: disabled", file=stream)
+    
+    def close(self):
+        if self.db:
+            with self.lock:
+                self.db.close()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for AWS and OpenAI APIs so the scripts can be exercised offline
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+def series_key(namespace, metric_name, dimensions, stat):
+    """Hashable key for one metric statistic"""
+    dims = tuple(sorted((d['Name'], d['Value']) for d in dimensions))
+    return (namespace, metric_name, dims, stat)
+
+class FakeClientError(Exception):
+    """Stand-in for botocore's ClientError, carrying the same response shape"""
+    def __init__(self, code, message=''):
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+class FakeCloudWatch:
+    """In-memory CloudWatch client supporting paginated get_metric_data, alarms and dashboards"""
+    # Alarm and dashboard calls can be given a latency, and throttled like the real API
+    # when more than max_in_flight of them run at once
+    def __init__(self, page_size=100800, latency=0.0, max_in_flight=None):
+        self.page_size = page_size
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        self.series = {}
+        self.alarms = {}
+        self.dashboards = {}
+        self.calls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+    
+    def request(self, operation, size=1):
+        """Record a control-plane call, simulating latency and throttling"""
+        with self.lock:
+            self.calls.append((operation, size))
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                self.throttled += 1
+                raise FakeClientError('Throttling', 'Rate exceeded')
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def put_datapoints(self, namespace, metric_name, dimensions, stat, points):
+        """Load (timestamp, value) datapoints for a metric statistic"""
+        key = series_key(namespace, metric_name, dimensions, stat)
+        self.series.setdefault(key, []).extend(points)
+    
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, NextToken=None,
+                        ScanBy='TimestampDescending', **kwargs):
+        self.calls.append(('get_metric_data', len(MetricDataQueries)))
+        
+        datapoints = []
+        for query in MetricDataQueries:
+            stat = query['MetricStat']
+            metric = stat['Metric']
+            key = series_key(metric['Namespace'], metric['MetricName'], metric.get('Dimensions', []), stat['Stat'])
+            points = [p for p in self.series.get(key, []) if StartTime <= p[0] <= EndTime]
+            points.sort(key=lambda p: p[0], reverse=ScanBy == 'TimestampDescending')
+            datapoints.extend((query['Id'], timestamp, value) for timestamp, value in points)
+        
+        offset = int(NextToken) if NextToken else 0
+        page = datapoints[offset:offset + self.page_size]
+        
+        results = {query['Id']: {'Id': query['Id'], 'Timestamps': [], 'Values': [], 'StatusCode': 'Complete'}
+                   for query in MetricDataQueries}
+        for query_id, timestamp, value in page:
+            results[query_id]['Timestamps'].append(timestamp)
+            results[query_id]['Values'].append(value)
+        
+        response = {'MetricDataResults': list(results.values()), 'Messages': []}
+        if offset + self.page_size < len(datapoints):
+            response['NextToken'] = str(offset + self.page_size)
+        return response
+    
+    def put_metric_alarm(self, **alarm):
+        self.request('put_metric_alarm', 1)
+        self.alarms[alarm['AlarmName']] = dict(alarm, StateValue='INSUFFICIENT_DATA')
+    
+    def describe_alarms(self, AlarmNames=None, MaxRecords=50, NextToken=None, **kwargs):
+        self.request('describe_alarms', len(AlarmNames or []))
+        names = AlarmNames if AlarmNames is not None else sorted(self.alarms)
+        found = [self.alarms[name] for name in names if name in self.alarms]
+        
+        offset = int(NextToken) if NextToken else 0
+        response = {'MetricAlarms': found[offset:offset + MaxRecords], 'CompositeAlarms': []}
+        if offset + MaxRecords < len(found):
+            response['NextToken'] = str(offset + MaxRecords)
+        return response
+    
+    def put_dashboard(self, DashboardName, DashboardBody):
+        self.request('put_dashboard', 1)
+        self.dashboards[DashboardName] = DashboardBody
+        return {'DashboardValidationMessages': []}
+    
+    def get_dashboard(self, DashboardName):
+        self.request('get_dashboard', 1)
+        if DashboardName not in self.dashboards:
+            raise FakeClientError('ResourceNotFound', f"Dashboard {DashboardName} does not exist")
+        return {'DashboardName': DashboardName, 'DashboardBody': self.dashboards[DashboardName]}
+    
+    def call_count(self, operation):
+        """Number of calls made to an operation"""
+        return sum(1 for name, _ in self.calls if name == operation)
+
+class FakeECS:
+    """In-memory ECS client for services, task definitions and rolling deployments"""
+    def __init__(self, settle_after=2):
+        # A new deployment becomes steady after this many describe_services calls
+        self.settle_after = settle_after
+        self.services = {}
+        self.task_definitions = []
+        self.calls = []
+    
+    def add_service(self, cluster, service, task_definition, desired_count=2):
+        self.services[(cluster, service)] = {
+            'serviceName': service,
+            'taskDefinition': task_definition,
+            'desiredCount': desired_count,
+            'deployments': [{
+                'status': 'PRIMARY', 'taskDefinition': task_definition, 'rolloutState': 'COMPLETED',
+                'desiredCount': desired_count, 'runningCount': desired_count, 'describes': 0
+            }]
+        }
+    
+    def register_task_definitions(self, *arns):
+        self.task_definitions.extend(arns)
+    
+    def describe_services(self, cluster, services, **kwargs):
+        self.calls.append(('describe_services', len(services)))
+        found = []
+        for name in services:
+            service = self.services.get((cluster, name))
+            if not service:
+                continue
+            
+            primary = service['deployments'][0]
+            primary['describes'] += 1
+            if primary['rolloutState'] == 'IN_PROGRESS' and primary['describes'] >= self.settle_after:
+                primary.update(rolloutState='COMPLETED', runningCount=primary['desiredCount'])
+                service['deployments'] = [primary]
+            
+            found.append({
+                **{k: v for k, v in service.items() if k != 'deployments'},
+                'deployments': [{k: v for k, v in d.items() if k != 'describes'} for d in service['deployments']]
+            })
+        return {'services': found, 'failures': []}
+    
+    def update_service(self, cluster, service, taskDefinition, **kwargs):
+        self.calls.append(('update_service', 1))
+        current = self.services[(cluster, service)]
+        for deployment in current['deployments']:
+            deployment['status'] = 'ACTIVE'
+        current['taskDefinition'] = taskDefinition
+        current['deployments'].insert(0, {
+            'status': 'PRIMARY', 'taskDefinition': taskDefinition, 'rolloutState': 'IN_PROGRESS',
+            'desiredCount': current['desiredCount'], 'runningCount': 0, 'describes': 0
+        })
+        return {'service': {'serviceName': service, 'taskDefinition': taskDefinition}}
+    
+    def list_task_definitions(self, familyPrefix='', sort='ASC', **kwargs):
+        self.calls.append(('list_task_definitions', 1))
+        arns = [arn for arn in self.task_definitions if arn.rsplit('/', 1)[-1].startswith(familyPrefix)]
+        arns.sort(key=lambda arn: int(arn.rsplit(':', 1)[-1]), reverse=sort == 'DESC')
+        return {'taskDefinitionArns': arns}
+    
+    def call_count(self, operation):
+        """Number of calls made to an operation"""
+        return sum(1 for name, _ in self.calls if name == operation)
+
+class FakeOpenAI:
+    """Stand-in for the openai module that records ChatCompletion calls"""
+    def __init__(self, responder=None, latency=0.0):
+        self.api_key = None
+        self.responder = responder or (lambda messages: '{}')
+        self.latency = latency
+        self.calls = []
+        self.ChatCompletion = self
+    
+    def create(self, model, messages, **kwargs):
+        self.calls.append({'model': model, 'messages': messages, **kwargs})
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.responder(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FakeSlackServer:
+    """Local HTTP stand-in for a Slack incoming webhook"""
+    def __init__(self, delay=0.0, fail_first=0, status_code=200):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.status_code = status_code
+        self.messages = []
+        self.requests = 0
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                fake.requests += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                
+                status = fake.status_code
+                if fake.requests <= fake.fail_first:
+                    status = 503
+                elif status < 300:
+                    fake.messages.append(json.loads(body))
+                
+                self.send_response(status)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class FakeWebApp:
+    """Local HTTP stand-in for the deployed web app, answering every GET path"""
+    def __init__(self, delay=0.0, status_code=200, body=b'{"status": "healthy"}'):
+        self.delay = delay
+        self.status_code = status_code
+        self.body = body
+        self.requests = 0
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this, delayed ACKs stall keep-alive clients
+            disable_nagle_algorithm = True
+            
+            def do_GET(self):
+                fake.requests += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                
+                self.send_response(fake.status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(fake.body)))
+                self.end_headers()
+                self.wfile.write(fake.body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
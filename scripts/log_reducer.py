@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Streaming reduction of test logs into a compact digest for analysis
+"""
+
+import hashlib
+import math
+import re
+import sys
+from collections import deque
+
+# Per-test result markers from Jest (react-scripts test) and pytest
+PASSED_TEST = re.compile(r'^\s*(✓|√|PASSED\b)|\sPASSED(\s|$)')
+FAILED_TEST = re.compile(r'^\s*(✕|×)\s+(?P<name>.+?)(\s+\(\d+\s*m?s\))?$|^FAILED\s+(?P<pytest>\S+)')
+# Start of a detailed failure report: "● Suite › test" (Jest) or "____ test_name ____" (pytest)
+FAILURE_HEADER = re.compile(r'^\s*●\s+(?P<jest>.+)$|^_{3,}\s+(?P<pytest>\S.*?)\s+_{3,}$')
+# Run totals: "Tests: 1 failed, 5 passed, 6 total" or "==== 1 failed, 5 passed in 0.12s ===="
+TOTALS = re.compile(r'^\s*Tests:\s+(?P<jest>.+)$|^=+\s+(?P<pytest>.*\b(passed|failed)\b.*?)\s+=+$')
+TOTAL_COUNT = re.compile(r'(\d+)\s+(passed|failed|skipped|error|errors)\b')
+STACK_FRAME = re.compile(r'^\s+(at\s|File\s")')
+ERROR_LINE = re.compile(r'\b(Error|Exception|Traceback|ERR!|FATAL)\b')
+VOLATILE = re.compile(r'0x[0-9a-f]+|\d+')
+# Bits of the fixed-size sketch counting distinct stack traces beyond the ones kept
+OVERFLOW_SKETCH_BITS = 1 << 16
+
+def normalize(text):
+    """Text with numbers and addresses masked, so repeats differing only in them compare equal"""
+    return VOLATILE.sub('#', text.strip())
+
+class LogReducer:
+    """Single pass over a test log keeping counts, failing tests and deduplicated stack traces"""
+    # Everything kept is bounded (max_failures reports of at most max_block_lines lines,
+    # max_traces stack traces, max_errors distinct error lines), so memory does not grow
+    # with the log size.
+    def __init__(self, max_failures=20, max_block_lines=25, max_errors=10, context_lines=3, max_traces=None):
+        self.max_failures = max_failures
+        self.max_traces = max_failures if max_traces is None else max_traces
+        self.max_block_lines = max_block_lines
+        self.max_errors = max_errors
+        self.passed = 0
+        self.failed = 0
+        self.totals = {}
+        self.lines = 0
+        self.failing_tests = []
+        self.failures = []
+        self.traces = {}
+        # Linear-counting sketch of the distinct traces not kept in self.traces
+        self.overflow_sketch = bytearray(OVERFLOW_SKETCH_BITS // 8)
+        self.errors = {}
+        self.recent = deque(maxlen=context_lines)
+        self.block = None
+    
+    def reduce(self, lines):
+        """Consume an iterable of log lines (e.g. an open file) and return self"""
+        for line in lines:
+            self.feed(line)
+        self.end_block()
+        return self
+    
+    def feed(self, line):
+        line = line.rstrip('\n')
+        self.lines += 1
+        
+        header = FAILURE_HEADER.match(line)
+        if header:
+            self.end_block()
+            self.block = {'test': (header.group('jest') or header.group('pytest')).strip(), 'lines': [], 'frames': [],
+                          'jest': bool(header.group('jest'))}
+            return
+        
+        # Jest failure reports are indented; pytest ones run until the next section rule
+        if self.block is not None and line.strip() and (
+                (self.block['jest'] and not line[0].isspace()) or line.startswith('====')):
+            self.end_block()
+        
+        totals = TOTALS.match(line)
+        if totals:
+            self.end_block()
+            for count, kind in TOTAL_COUNT.findall(totals.group('jest') or totals.group('pytest')):
+                self.totals[kind.rstrip('s') if kind == 'errors' else kind] = int(count)
+            return
+        
+        if PASSED_TEST.search(line):
+            self.passed += 1
+        failed = FAILED_TEST.match(line)
+        if failed:
+            self.failed += 1
+            name = (failed.group('name') or failed.group('pytest')).strip()
+            if len(self.failing_tests) < self.max_failures * 5:
+                self.failing_tests.append(name)
+        
+        if self.block is not None:
+            if STACK_FRAME.match(line):
+                self.block['frames'].append(line.strip())
+                del self.block['frames'][:-self.max_block_lines]
+            elif len(self.block['lines']) < self.max_block_lines and line.strip():
+                self.block['lines'].append(line.rstrip())
+        elif ERROR_LINE.search(line) and not failed:
+            key = normalize(line)
+            if key in self.errors:
+                self.errors[key]['count'] += 1
+            elif len(self.errors) < self.max_errors:
+                self.errors[key] = {'line': line.strip()[:300], 'context': list(self.recent), 'count': 1}
+        
+        self.recent.append(line.strip()[:300])
+    
+    def end_block(self):
+        """Close the failure report being read, folding its stack trace into the trace table"""
+        block, self.block = self.block, None
+        if block is None:
+            return
+        
+        trace = None
+        if block['frames']:
+            signature = hashlib.sha1('\n'.join(normalize(f) for f in block['frames']).encode()).hexdigest()
+            if signature in self.traces:
+                self.traces[signature]['tests'] += 1
+                trace = signature
+            elif len(self.traces) < self.max_traces:
+                self.traces[signature] = {'first_test': block['test'], 'frames': block['frames'][:8], 'tests': 1}
+                trace = signature
+            else:
+                bit = int(signature[:8], 16) % OVERFLOW_SKETCH_BITS
+                self.overflow_sketch[bit // 8] |= 1 << (bit % 8)
+        
+        # Failures with the same message and trace are reported once with a count
+        key = (normalize('\n'.join(block['lines'])), trace)
+        for failure in self.failures:
+            if failure['key'] == key:
+                failure['repeats'] += 1
+                return
+        if len(self.failures) < self.max_failures:
+            self.failures.append({'test': block['test'], 'message': block['lines'], 'trace': trace,
+                                  'key': key, 'repeats': 0})
+    
+    def overflow_traces(self):
+        """Estimated number of distinct stack traces beyond max_traces"""
+        empty = OVERFLOW_SKETCH_BITS - sum(bin(byte).count('1') for byte in self.overflow_sketch)
+        if empty == OVERFLOW_SKETCH_BITS:
+            return 0
+        return round(OVERFLOW_SKETCH_BITS * math.log(OVERFLOW_SKETCH_BITS / max(empty, 1)))
+    
+    def counts(self):
+        """Passed/failed counts, preferring the runner's own totals line"""
+        return {
+            'passed': self.totals.get('passed', self.passed),
+            'failed': self.totals.get('failed', self.failed) + self.totals.get('error', 0),
+            'skipped': self.totals.get('skipped', 0)
+        }
+    
+    def digest(self):
+        """Compact text for the model: counts, failing tests with context, unique stack traces, errors"""
+        counts = self.counts()
+        out = [f"Log lines: {self.lines}",
+               f"Passed: {counts['passed']}, failed: {counts['failed']}, skipped: {counts['skipped']}"]
+        
+        if self.failing_tests:
+            names = list(dict.fromkeys(self.failing_tests))
+            out.append("Failing tests:")
+            out.extend(f"  - {name}" for name in names[:self.max_failures])
+            if len(names) > self.max_failures:
+                out.append(f"  ... and {len(names) - self.max_failures} more")
+        
+        trace_numbers = {signature: number for number, signature in enumerate(self.traces, 1)}
+        for failure in self.failures:
+            repeated = f" (and {failure['repeats']} more failures like it)" if failure['repeats'] else ""
+            out.append(f"Failure: {failure['test']}{repeated}")
+            out.extend(f"    {line}" for line in failure['message'])
+            if failure['trace']:
+                out.append(f"    [stack trace #{trace_numbers[failure['trace']]}]")
+        
+        for signature, trace in self.traces.items():
+            out.append(f"Stack trace #{trace_numbers[signature]} (seen in {trace['tests']} failures, "
+                       f"first in {trace['first_test']}):")
+            out.extend(f"    {frame}" for frame in trace['frames'])
+        overflow = self.overflow_traces()
+        if overflow:
+            out.append(f"... and about {overflow} more distinct stack traces")
+        
+        if self.errors:
+            out.append("Other errors:")
+            for error in self.errors.values():
+                repeated = f" (x{error['count']})" if error['count'] > 1 else ""
+                out.append(f"  {error['line']}{repeated}")
+        return '\n'.join(out)
+    
+    def summary(self):
+        """Local analysis in the analyze_test_results schema, without a model call"""
+        counts = self.counts()
+        total = counts['passed'] + counts['failed']
+        failures = list(dict.fromkeys(self.failing_tests or [f['test'] for f in self.failures]))
+        
+        if total:
+            health_score = max(1, round(10 * counts['passed'] / total))
+            # Any failure keeps the score below a perfect 10
+            if counts['failed']:
+                health_score = min(9, health_score)
+        else:
+            health_score = 5
+        recommendations = []
+        if failures:
+            recommendations.append(f"Fix the {len(failures)} failing test(s), starting with {failures[0]}")
+        if any(trace['tests'] > 1 for trace in self.traces.values()):
+            recommendations.append("Several failures share a stack trace - look for a common root cause")
+        if self.errors:
+            recommendations.append("Check the errors logged outside test failures")
+        
+        return {
+            "summary": f"{counts['passed']} passed, {counts['failed']} failed, {counts['skipped']} skipped",
+            "failures": failures,
+            "recommendations": recommendations,
+            "health_score": health_score
+        }
+
+def main():
+    # Usage: python3 log_reducer.py [test_log_file]   (reads stdin without a file)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', errors='replace') as f:
+            reducer = LogReducer().reduce(f)
+    else:
+        reducer = LogReducer().reduce(sys.stdin)
+    print(reducer.digest())
+
+if __name__ == "__main__":
+    main()
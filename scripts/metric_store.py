@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Local SQLite time-series cache for CloudWatch datapoints
+"""
+
+import calendar
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_CACHE_PATH = os.path.join('~', '.cache', 'cartoon-animation-web', 'metrics.db')
+
+def to_epoch(timestamp):
+    """Seconds since the epoch for a naive-UTC or timezone-aware datetime"""
+    return calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+
+def from_epoch(seconds):
+    """Naive UTC datetime, matching the datetime.utcnow() values used by the scripts"""
+    return datetime.utcfromtimestamp(seconds)
+
+def series_cache_key(query):
+    """Cache key of a GetMetricData query: namespace, metric, dimensions, period and stat"""
+    stat = query['MetricStat']
+    metric = stat['Metric']
+    dimensions = sorted((d['Name'], d['Value']) for d in metric.get('Dimensions', []))
+    return json.dumps([metric['Namespace'], metric['MetricName'], dimensions, stat['Period'], stat['Stat']])
+
+class MetricStore:
+    """Append-only datapoint cache with per-series coverage tracking and eviction"""
+    def __init__(self, path=None, max_age_days=7, max_rows=500000):
+        path = path or os.getenv('METRICS_CACHE_PATH', DEFAULT_CACHE_PATH)
+        if path != ':memory:':
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS datapoints (
+                series TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (series, timestamp)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS datapoints_timestamp ON datapoints (timestamp);
+            CREATE TABLE IF NOT EXISTS coverage (
+                series TEXT PRIMARY KEY,
+                covered_from REAL NOT NULL,
+                covered_until REAL NOT NULL
+            );
+        ''')
+        self.evict()
+    
+    def coverage(self, series):
+        """(covered_from, covered_until) epoch seconds already fetched for a series, or None"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT covered_from, covered_until FROM coverage WHERE series = ?', (series,)
+            ).fetchone()
+    
+    def missing_from(self, series, start_time, end_time):
+        """Start of the range that still has to be fetched for a window, or None if fully cached"""
+        start, end = to_epoch(start_time), to_epoch(end_time)
+        covered = self.coverage(series)
+        # Coverage ending before the window is not extended: backfilling the gap since the
+        # last run (up to max_age) would fetch days of data for a five-minute window
+        if covered is None or start < covered[0] or covered[1] < start:
+            return start_time
+        if covered[1] >= end:
+            return None
+        # Continue from the end of the coverage so it stays contiguous
+        return from_epoch(covered[1])
+    
+    def append(self, series, points, fetched_from, settled_until):
+        """Store fetched datapoints and extend the series coverage"""
+        # Datapoints after settled_until may still change in CloudWatch, so they are
+        # stored but left outside the coverage and fetched again next time
+        start, settled = to_epoch(fetched_from), to_epoch(settled_until)
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO datapoints (series, timestamp, value) VALUES (?, ?, ?)',
+                [(series, to_epoch(timestamp), value) for timestamp, value in points]
+            )
+            covered = self.db.execute(
+                'SELECT covered_from, covered_until FROM coverage WHERE series = ?', (series,)
+            ).fetchone()
+            if covered and covered[0] <= start <= covered[1]:
+                start, settled = covered[0], max(covered[1], settled)
+            self.db.execute(
+                'INSERT OR REPLACE INTO coverage (series, covered_from, covered_until) VALUES (?, ?, ?)',
+                (series, start, max(start, settled))
+            )
+    
+    def query(self, series, start_time, end_time):
+        """Cached (timestamp, value) datapoints of a series within a window, oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT timestamp, value FROM datapoints WHERE series = ? AND timestamp BETWEEN ? AND ? '
+                'ORDER BY timestamp',
+                (series, to_epoch(start_time), to_epoch(end_time))
+            ).fetchall()
+        return [(from_epoch(timestamp), value) for timestamp, value in rows]
+    
+    def evict(self):
+        """Drop datapoints older than max_age, then the oldest ones beyond max_rows"""
+        cutoff = time.time() - self.max_age
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM datapoints WHERE timestamp < ?', (cutoff,))
+            self.db.execute('DELETE FROM coverage WHERE covered_until < ?', (cutoff,))
+            self.db.execute('UPDATE coverage SET covered_from = ? WHERE covered_from < ?', (cutoff, cutoff))
+            
+            excess = self.db.execute('SELECT COUNT(*) FROM datapoints').fetchone()[0] - self.max_rows
+            if excess > 0:
+                oldest_kept = self.db.execute(
+                    'SELECT timestamp FROM datapoints ORDER BY timestamp LIMIT 1 OFFSET ?', (excess,)
+                ).fetchone()[0]
+                self.db.execute('DELETE FROM datapoints WHERE timestamp < ?', (oldest_kept,))
+                self.db.execute('DELETE FROM coverage WHERE covered_until < ?', (oldest_kept,))
+                self.db.execute(
+                    'UPDATE coverage SET covered_from = ? WHERE covered_from < ?', (oldest_kept, oldest_kept)
+                )
+    
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -3,34 +3,217 @@
 Real-time deployment monitoring with AI-powered anomaly detection
 """
 
-import boto3
+import asyncio
 import json
 import time
-import requests
 import os
 import sys
+import threading
 from datetime import datetime, timedelta
-import openai
+import numpy as np
+from cloudwatch_metrics import get_metric_data_incremental, latest_complete, metric_query
+from metric_store import MetricStore
+from anomaly_detection import LocalAnomalyDetector
+from alert_dispatcher import AlertDispatcher
+from poll_scheduler import AdaptivePoller, TokenBucket, WebhookListener, is_deployment_event
+from task_definition_index import TaskDefinitionIndex, service_key, task_family
+from canary_analysis import CanaryAnalyzer, HOLD, PROMOTE, ROLLBACK
+from lazy_loading import LazyModule, aws_client, lazy_attribute
+from telemetry import Telemetry, telemetry_from_spec
+
+openai = LazyModule('openai')
+
+# Metrics evaluated for every service, in metric-axis order of the metric arrays
+METRIC_NAMES = ['error_rate', 'avg_latency', 'p50_latency', 'p90_latency', 'p99_latency', 'p999_latency',
+                'cpu_usage', 'memory_usage']
+# ALB TargetResponseTime statistic behind each latency metric; CloudWatch reports seconds
+LATENCY_STATS = {
+    'avg_latency': 'Average',
+    'p50_latency': 'p50',
+    'p90_latency': 'p90',
+    'p99_latency': 'p99',
+    'p999_latency': 'p99.9'
+}
+# Factor converting each metric as fetched to the unit it is kept in (latency in milliseconds)
+METRIC_SCALE = np.array([1000.0 if name in LATENCY_STATS else 1.0 for name in METRIC_NAMES])
+# Threshold compared against each metric, and how a breach is reported
+THRESHOLD_KEYS = ['error_rate', 'response_time', 'latency', 'p90_latency', 'p99_latency', 'p999_latency',
+                  'cpu_usage', 'memory_usage']
+ALERT_FORMATS = [
+    "High error rate: {:.1f}%",
+    "High response time: {:.1f}ms",
+    "High median response time: {:.1f}ms",
+    "High p90 response time: {:.1f}ms",
+    "High p99 response time: {:.1f}ms",
+    "High p99.9 response time: {:.1f}ms",
+    "High CPU usage: {:.1f}%",
+    "High memory usage: {:.1f}%"
+]
+# Smallest deviation of each metric worth noticing in the local anomaly detector
+ANOMALY_MIN_STD = [1.0, 50.0, 50.0, 75.0, 150.0, 250.0, 2.0, 2.0]
+# Resolution of the metrics watched every tick; ALB percentiles are published per minute
+METRIC_PERIOD = 60
+# error_rate is derived per period from these ALB Sums, so the 5% threshold holds at any resolution
+ERROR_RATE_COUNTS = {'errors': 'HTTPCode_Target_5XX_Count', 'requests': 'RequestCount'}
+
+DEFAULT_TARGETS = [
+    {
+        'name': 'cartoon-web-service',
+        'cluster': 'cartoon-cluster',
+        'service': 'cartoon-web-service',
+        'load_balancer': 'cartoon-alb',
+        'task_family': 'cartoon-task-definition'
+    }
+]
+
+def load_targets(path):
+    """Load the services to monitor from a JSON list of target objects"""
+    with open(path, 'r') as f:
+        targets = json.load(f)
+    
+    for target in targets:
+        target.setdefault('name', target['service'])
+        target.setdefault('cluster', DEFAULT_TARGETS[0]['cluster'])
+        target.setdefault('task_family', DEFAULT_TARGETS[0]['task_family'])
+    return targets
 
 class DeploymentMonitor:
-    def __init__(self, openai_api_key, slack_webhook_url=None):
+    def __init__(self, openai_api_key, slack_webhook_url=None, metric_store=None,
+                 cloudwatch=None, ecs=None, alb=None, targets=None, history_size=60,
+                 poller=None, max_polls_per_second=0.2, task_index=None, telemetry=None):
         self.openai_api_key = openai_api_key
         self.slack_webhook_url = slack_webhook_url
-        self.cloudwatch = boto3.client('cloudwatch')
-        self.ecs = boto3.client('ecs')
-        self.alb = boto3.client('elbv2')
+        # Spans around every I/O stage and API call counters; exported only if configured
+        self.telemetry = telemetry or Telemetry()
+        self.alert_dispatcher = (AlertDispatcher(slack_webhook_url, telemetry=self.telemetry)
+                                 if slack_webhook_url else None)
+        self.metric_store = metric_store or MetricStore()
+        # AWS clients are created on first use unless given
+        for name, client in (('cloudwatch', cloudwatch), ('ecs', ecs), ('alb', alb)):
+            if client is not None:
+                setattr(self, name, self.telemetry.instrument(client, name))
+        
+        # Services and load balancers watched by this process
+        self.targets = targets or DEFAULT_TARGETS
+        self.service_names = [target['name'] for target in self.targets]
+        
+        # Rolling services x metrics x time history of observed ticks
+        self.history = np.full((len(self.targets), len(METRIC_NAMES), history_size), np.nan)
+        self.history_length = 0
+        # Newest CloudWatch datapoint seen; fast polling re-reads it until the next one is published
+        self.last_datapoint_time = None
+        # Evidence a revision is good: samples with data, and a threshold breach on the latest tick
+        self.observed_ticks = np.zeros(len(self.targets), dtype=int)
+        self.breaching = np.zeros(len(self.targets), dtype=bool)
+        
+        # Cheap local detection; the LLM is only consulted when this flags something
+        self.local_detector = LocalAnomalyDetector(METRIC_NAMES, self.service_names, min_std=ANOMALY_MIN_STD)
+        self.llm_calls = 0
+        
+        # Poll fast after a deploy or near a threshold, back off while stable, and never
+        # exceed max_polls_per_second so pushed events cannot trigger a CloudWatch storm
+        self.poller = poller or AdaptivePoller()
+        self.max_polls_per_second = max_polls_per_second
+        
+        # Rollback revisions are resolved when monitoring starts, not when a rollback is needed
+        self.task_index = task_index or TaskDefinitionIndex()
+        self.current_task_definitions = {}
+        self.rollback_targets = {}
+        self.recovery_threads = []
+        self.recoveries = []
+        # Latest canary verdict of each service deployed with a canary target group
+        self.canary_results = {}
         
         # Monitoring thresholds
         self.thresholds = {
             'error_rate': 5.0,  # 5% error rate
             'cpu_usage': 80.0,  # 80% CPU
             'memory_usage': 85.0,  # 85% memory
-            'response_time': 2000,  # 2 seconds
-            'latency': 1000  # 1 second
+            'response_time': 2000,  # 2 seconds average
+            'latency': 1000,  # 1 second median
+            'p90_latency': 3000,  # 3 seconds
+            'p99_latency': 5000,  # 5 seconds
+            'p999_latency': 10000  # 10 seconds
+        }
+    
+    @lazy_attribute
+    def cloudwatch(self):
+        return self.telemetry.instrument(aws_client('cloudwatch'), 'cloudwatch')
+    
+    @lazy_attribute
+    def ecs(self):
+        return self.telemetry.instrument(aws_client('ecs'), 'ecs')
+    
+    @lazy_attribute
+    def alb(self):
+        return self.telemetry.instrument(aws_client('elbv2'), 'alb')
+    
+    @lazy_attribute
+    def canary_analyzers(self):
+        """Canary analysis of every target with a canary_target_group, comparing from now on"""
+        return {
+            index: CanaryAnalyzer(target['load_balancer'], target['target_group'], target['canary_target_group'],
+                                  cloudwatch=self.cloudwatch, metric_store=self.metric_store)
+            for index, target in enumerate(self.targets) if target.get('canary_target_group')
         }
+    
+    @lazy_attribute
+    def baseline_metrics(self):
+        """Baseline metrics (from previous successful deployment), one row per service"""
+        # Fetched on first use rather than in the constructor, so creating a monitor does no I/O
+        return self.get_baseline_metrics()
+    
+    def metric_queries(self, period):
+        """GetMetricData queries for every metric of every monitored service"""
+        queries = []
+        for index, target in enumerate(self.targets):
+            alb_dimensions = [{'Name': 'LoadBalancer', 'Value': target['load_balancer']}]
+            service_dimensions = [{'Name': 'ServiceName', 'Value': target['service']}]
+            queries.extend(
+                metric_query(f'{name}_{index}', 'AWS/ApplicationELB', metric_name, alb_dimensions, 'Sum', period)
+                for name, metric_name in ERROR_RATE_COUNTS.items()
+            )
+            # Tail percentiles as well as the average, so a slow tail is not averaged away
+            queries.extend(
+                metric_query(f'{name}_{index}', 'AWS/ApplicationELB', 'TargetResponseTime', alb_dimensions, stat, period)
+                for name, stat in LATENCY_STATS.items()
+            )
+            queries.extend([
+                metric_query(f'cpu_usage_{index}', 'AWS/ECS', 'CPUUtilization',
+                             service_dimensions, 'Average', period),
+                metric_query(f'memory_usage_{index}', 'AWS/ECS', 'MemoryUtilization',
+                             service_dimensions, 'Average', period)
+            ])
+        return queries
+    
+    def service_series(self, series, index):
+        """(timestamp, value) series of every metric of one service, keyed by metric name"""
+        # CloudWatch omits 5XX datapoints for periods without errors, and minutes without
+        # requests have no error rate at all
+        errors = dict(series[f'errors_{index}'])
+        by_name = {'error_rate': [(timestamp, 100.0 * errors.get(timestamp, 0.0) / requests)
+                                  for timestamp, requests in series[f'requests_{index}'] if requests > 0]}
+        for name in METRIC_NAMES:
+            by_name.setdefault(name, series.get(f'{name}_{index}', []))
+        return by_name
+    
+    def fetch_metric_matrix(self, start_time, end_time, period=300, default=0):
+        """Value of every metric for every service in its last complete period, as a services x
+        metrics array, and the timestamp of the newest period scored"""
+        series = get_metric_data_incremental(
+            self.cloudwatch, self.metric_store, self.metric_queries(period), start_time, end_time
+        )
         
-        # Baseline metrics (from previous successful deployment)
-        self.baseline_metrics = self.get_baseline_metrics()
+        values = np.full((len(self.targets), len(METRIC_NAMES)), default, dtype=float)
+        newest = None
+        for index in range(len(self.targets)):
+            service_series = self.service_series(series, index)
+            for column, name in enumerate(METRIC_NAMES):
+                point = latest_complete(service_series[name], period, end_time)
+                if point:
+                    values[index, column] = point[1]
+                    newest = point[0] if newest is None else max(newest, point[0])
+        return values * METRIC_SCALE, newest
     
     def get_baseline_metrics(self):
         """Get baseline metrics from previous successful deployment"""
@@ -38,125 +221,138 @@ class DeploymentMonitor:
             end_time = datetime.utcnow() - timedelta(hours=1)
             start_time = end_time - timedelta(hours=1)
             
-            # Get baseline error rate
-            error_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ApplicationELB',
-                MetricName='HTTPCode_Target_5XX_Count',
-                Dimensions=[{'Name': 'LoadBalancer', 'Value': 'cartoon-alb'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Sum']
-            )
-            
-            # Get baseline CPU
-            cpu_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ECS',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'ServiceName', 'Value': 'cartoon-web-service'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Average']
-            )
-            
-            return {
-                'error_rate': error_response['Datapoints'][-1]['Sum'] if error_response['Datapoints'] else 0,
-                'cpu_usage': cpu_response['Datapoints'][-1]['Average'] if cpu_response['Datapoints'] else 0
-            }
+            # Baselines for every service, fetched only if not already cached. Same period as the
+            # ticks, so per-period Sums such as error_rate compare like for like
+            with self.telemetry.span('fetch_baseline'):
+                return self.fetch_metric_matrix(start_time, end_time, METRIC_PERIOD)[0]
         except Exception as e:
             print(f"Error getting baseline metrics: {e}")
-            return {'error_rate': 0, 'cpu_usage': 0}
+            return np.zeros((len(self.targets), len(METRIC_NAMES)))
     
     def get_current_metrics(self):
-        """Get current deployment metrics"""
+        """Get current deployment metrics for all services"""
         try:
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(minutes=5)
             
-            # Error rate
-            error_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ApplicationELB',
-                MetricName='HTTPCode_Target_5XX_Count',
-                Dimensions=[{'Name': 'LoadBalancer', 'Value': 'cartoon-alb'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Sum']
-            )
-            
-            # Response time
-            latency_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ApplicationELB',
-                MetricName='TargetResponseTime',
-                Dimensions=[{'Name': 'LoadBalancer', 'Value': 'cartoon-alb'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Average']
-            )
-            
-            # CPU usage
-            cpu_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ECS',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'ServiceName', 'Value': 'cartoon-web-service'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Average']
-            )
-            
-            # Memory usage
-            memory_response = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/ECS',
-                MetricName='MemoryUtilization',
-                Dimensions=[{'Name': 'ServiceName', 'Value': 'cartoon-web-service'}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=300,
-                Statistics=['Average']
-            )
-            
+            # Every metric of every service in one batched request for uncached datapoints
+            with self.telemetry.span('fetch_metrics'):
+                values, datapoint_time = self.fetch_metric_matrix(start_time, end_time, METRIC_PERIOD,
+                                                                  default=np.nan)
             return {
-                'error_rate': error_response['Datapoints'][-1]['Sum'] if error_response['Datapoints'] else 0,
-                'avg_latency': latency_response['Datapoints'][-1]['Average'] if latency_response['Datapoints'] else 0,
-                'cpu_usage': cpu_response['Datapoints'][-1]['Average'] if cpu_response['Datapoints'] else 0,
-                'memory_usage': memory_response['Datapoints'][-1]['Average'] if memory_response['Datapoints'] else 0,
+                'values': np.nan_to_num(values),
+                # Services with at least one datapoint in the window; the rest read as zeros
+                'observed': ~np.isnan(values).all(axis=1),
+                'datapoint_time': datapoint_time,
                 'timestamp': end_time.isoformat()
             }
         except Exception as e:
             print(f"Error getting current metrics: {e}")
             return None
     
+    def service_metrics(self, metrics, index):
+        """Metrics of one service as a name -> value dict"""
+        service_metrics = dict(zip(METRIC_NAMES, metrics['values'][index].tolist()))
+        service_metrics['timestamp'] = metrics['timestamp']
+        return service_metrics
+    
+    def record_metrics(self, metrics):
+        """Append one tick to the rolling history"""
+        self.history[:, :, self.history_length % self.history.shape[2]] = metrics['values']
+        self.history_length += 1
+    
+    def recent_history(self):
+        """Recorded ticks as a services x metrics x time array, oldest first"""
+        size = self.history.shape[2]
+        if self.history_length <= size:
+            return self.history[:, :, :self.history_length]
+        return np.roll(self.history, -(self.history_length % size), axis=2)
+    
+    def prime_anomaly_detector(self, hours=3):
+        """Warm the local anomaly detector with recent (mostly cached) metric history"""
+        try:
+            end_time = datetime.utcnow()
+            start_time = end_time - timedelta(hours=hours)
+            with self.telemetry.span('prime_detector'):
+                # Same resolution as the ticks the detector will score
+                series = get_metric_data_incremental(
+                    self.cloudwatch, self.metric_store, self.metric_queries(METRIC_PERIOD), start_time, end_time
+                )
+            
+            # Align the series on their timestamps, carrying the last value forward
+            samples = {}
+            for index in range(len(self.targets)):
+                service_series = self.service_series(series, index)
+                for column, name in enumerate(METRIC_NAMES):
+                    for timestamp, value in service_series[name]:
+                        samples.setdefault(timestamp, []).append((index, column, value))
+            
+            last_values = np.zeros((len(self.targets), len(METRIC_NAMES)))
+            history = []
+            for timestamp in sorted(samples):
+                for index, column, value in samples[timestamp]:
+                    last_values[index, column] = value
+                history.append((timestamp, last_values * METRIC_SCALE))
+            
+            self.local_detector.prime(history)
+        except Exception as e:
+            print(f"Error priming anomaly detector: {e}")
+    
     def detect_anomalies(self, current_metrics):
-        """Detect anomalies using AI analysis"""
+        """Detect anomalies locally, escalating flagged services to AI analysis"""
         if not current_metrics:
             return None
         
+        timestamp = datetime.fromisoformat(current_metrics['timestamp'])
+        with self.telemetry.span('local_detection'):
+            scores, flagged = self.local_detector.update(current_metrics['values'], timestamp)
+        
+        analyses = []
+        for index in np.flatnonzero(flagged.any(axis=1)):
+            local_analysis = self.local_detector.result(scores[index], flagged[index])
+            analysis = self.analyze_service_anomaly(index, current_metrics, local_analysis)
+            analysis['service'] = self.service_names[index]
+            analysis['service_index'] = int(index)
+            analyses.append(analysis)
+        return analyses
+    
+    def analyze_service_anomaly(self, index, current_metrics, local_analysis):
+        """Ask the LLM to assess an anomaly flagged by the local detector for one service"""
+        metrics = self.service_metrics(current_metrics, index)
+        baseline = dict(zip(METRIC_NAMES, self.baseline_metrics[index].tolist()))
+        
         # Calculate percentage changes from baseline
-        error_change = ((current_metrics['error_rate'] - self.baseline_metrics['error_rate']) / 
-                       max(self.baseline_metrics['error_rate'], 1)) * 100
-        cpu_change = current_metrics['cpu_usage'] - self.baseline_metrics['cpu_usage']
+        error_change = ((metrics['error_rate'] - baseline['error_rate']) / 
+                       max(baseline['error_rate'], 1)) * 100
+        cpu_change = metrics['cpu_usage'] - baseline['cpu_usage']
+        # Recent p99 from the rolling history shows whether a slow tail is building up or a blip
+        recent_p99 = self.recent_history()[index, METRIC_NAMES.index('p99_latency'), -10:]
         
         prompt = f"""
-        Analyze these deployment metrics for anomalies:
+        Analyze these deployment metrics for anomalies in service {self.service_names[index]}:
         
         Current Metrics:
-        - Error Rate: {current_metrics['error_rate']} (change: {error_change:.1f}%)
-        - CPU Usage: {current_metrics['cpu_usage']:.1f}% (change: {cpu_change:.1f}%)
-        - Memory Usage: {current_metrics['memory_usage']:.1f}%
-        - Avg Latency: {current_metrics['avg_latency']:.1f}ms
+        - Error Rate: {metrics['error_rate']} (change: {error_change:.1f}%)
+        - CPU Usage: {metrics['cpu_usage']:.1f}% (change: {cpu_change:.1f}%)
+        - Memory Usage: {metrics['memory_usage']:.1f}%
+        - Avg Latency: {metrics['avg_latency']:.1f}ms
+        - Latency p50/p90/p99/p99.9: {metrics['p50_latency']:.1f}/{metrics['p90_latency']:.1f}/{metrics['p99_latency']:.1f}/{metrics['p999_latency']:.1f}ms
+        - Recent p99 Latency (oldest first): {', '.join(f'{value:.0f}' for value in recent_p99)}ms
         
         Baseline Metrics:
-        - Error Rate: {self.baseline_metrics['error_rate']}
-        - CPU Usage: {self.baseline_metrics['cpu_usage']:.1f}%
+        - Error Rate: {baseline['error_rate']}
+        - CPU Usage: {baseline['cpu_usage']:.1f}%
+        - Latency p50/p99: {baseline['p50_latency']:.1f}/{baseline['p99_latency']:.1f}ms
+        
+        Local detector flagged: {', '.join(local_analysis['flagged_metrics'])}
+        Deviation scores (standard deviations above baseline): {local_analysis['scores']}
         
         Thresholds:
         - Error Rate: {self.thresholds['error_rate']}%
         - CPU Usage: {self.thresholds['cpu_usage']}%
         - Memory Usage: {self.thresholds['memory_usage']}%
         - Response Time: {self.thresholds['response_time']}ms
+        - p99 Response Time: {self.thresholds['p99_latency']}ms
         
         Determine:
         1. Are there any anomalies? (YES/NO)
@@ -178,36 +374,53 @@ class DeploymentMonitor:
         
         try:
             openai.api_key = self.openai_api_key
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400
-            )
+            self.llm_calls += 1
+            self.telemetry.count('api_calls', api='openai', operation='chat_completion')
+            with self.telemetry.span('openai.chat_completion', service=self.service_names[index]):
+                response = openai.ChatCompletion.create(
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=400
+                )
             return json.loads(response.choices[0].message.content)
         except Exception as e:
+            self.telemetry.count('api_errors', api='openai', operation='chat_completion')
             print(f"Error in AI anomaly detection: {e}")
-            return None
+            # Fall back to the local verdict rather than ignoring the anomaly
+            return local_analysis
+    
+    def threshold_limits(self):
+        """Threshold of each metric column"""
+        return np.array([self.thresholds[key] for key in THRESHOLD_KEYS])
     
     def check_thresholds(self, metrics):
         """Check if metrics exceed thresholds"""
-        alerts = []
+        values = metrics['values']
+        limits = self.threshold_limits()
         
-        if metrics['error_rate'] > self.thresholds['error_rate']:
-            alerts.append(f"High error rate: {metrics['error_rate']:.1f}%")
-        
-        if metrics['cpu_usage'] > self.thresholds['cpu_usage']:
-            alerts.append(f"High CPU usage: {metrics['cpu_usage']:.1f}%")
-        
-        if metrics['memory_usage'] > self.thresholds['memory_usage']:
-            alerts.append(f"High memory usage: {metrics['memory_usage']:.1f}%")
-        
-        if metrics['avg_latency'] > self.thresholds['response_time']:
-            alerts.append(f"High response time: {metrics['avg_latency']:.1f}ms")
+        # One comparison across all services; only breaches are turned into messages
+        alerts = []
+        for index, column in np.argwhere(values > limits):
+            message = ALERT_FORMATS[column].format(values[index, column])
+            alerts.append(f"{self.service_names[index]}: {message}")
         
         return alerts
     
+    def threshold_pressure(self, metrics):
+        """Highest metric/threshold ratio across services, now or projected from the recent trend"""
+        limits = self.threshold_limits()
+        pressure = np.max(metrics['values'] / limits)
+        
+        history = self.recent_history()
+        if history.shape[2] >= 3:
+            slope = (history[:, :, -1] - history[:, :, -3]) / 2
+            projected = history[:, :, -1] + 3 * slope
+            pressure = max(pressure, np.nanmax(projected / limits))
+        return float(pressure)
+    
     def send_alert(self, message, severity="INFO"):
-        """Send alert to Slack"""
+        """Queue alert for Slack"""
+        self.telemetry.count('alerts', severity=severity)
         if not self.slack_webhook_url:
             print(f"Alert: {message}")
             return
@@ -227,118 +440,353 @@ class DeploymentMonitor:
             "icon_emoji": ":robot_face:"
         }
         
+        # Delivery happens on the dispatcher thread so the monitor loop never waits on Slack
+        self.alert_dispatcher.submit(slack_message, message, severity)
+    
+    def describe_task_definitions(self):
+        """Current task definition of every monitored service, batched per cluster"""
+        services_by_cluster = {}
+        for target in self.targets:
+            services_by_cluster.setdefault(target['cluster'], []).append(target['service'])
+        
+        current = {}
+        for cluster, services in services_by_cluster.items():
+            # DescribeServices accepts at most 10 services per call
+            for offset in range(0, len(services), 10):
+                response = self.ecs.describe_services(cluster=cluster, services=services[offset:offset + 10])
+                for service in response['services']:
+                    current[f"{cluster}/{service['serviceName']}"] = service['taskDefinition']
+        return current
+    
+    def previous_revision(self, current_arn):
+        """Revision registered before the current one, for services without known-good history"""
+        family = task_family(current_arn)
+        response = self.ecs.list_task_definitions(familyPrefix=family, status='ACTIVE', sort='DESC')
+        arns = [arn for arn in response['taskDefinitionArns'] if task_family(arn) == family]
+        
+        if current_arn not in arns:
+            return None
+        position = arns.index(current_arn)
+        return arns[position + 1] if position + 1 < len(arns) else None
+    
+    def preload_rollback_targets(self):
+        """Resolve the rollback revision of every service so a rollback is a single update_service"""
         try:
-            response = requests.post(self.slack_webhook_url, json=slack_message)
-            response.raise_for_status()
+            with self.telemetry.span('preload_rollback_targets'):
+                self.current_task_definitions = self.describe_task_definitions()
+                for target in self.targets:
+                    key = service_key(target)
+                    current = self.current_task_definitions.get(key)
+                    if not current:
+                        continue
+                    
+                    candidate = self.task_index.rollback_candidate(target, current) or self.previous_revision(current)
+                    if candidate:
+                        self.rollback_targets[key] = candidate
         except Exception as e:
-            print(f"Error sending Slack alert: {e}")
+            print(f"Error preloading rollback targets: {e}")
     
-    def rollback_deployment(self):
+    def passed_monitoring(self, index, rolled_back):
+        """Whether a service's revision was actually seen healthy, rather than just not rolled back"""
+        verdict = self.canary_results.get(index, {}).get('verdict')
+        return (index not in rolled_back and self.observed_ticks[index] > 0 and not self.breaching[index]
+                and verdict not in (HOLD, ROLLBACK))
+    
+    def record_known_good(self, rolled_back):
+        """Record the deployed revisions of services that passed monitoring"""
+        try:
+            current = self.describe_task_definitions()
+            for index, target in enumerate(self.targets):
+                arn = current.get(service_key(target))
+                if not arn:
+                    continue
+                if self.passed_monitoring(index, rolled_back):
+                    self.task_index.record_good(target, arn)
+                elif index not in rolled_back:
+                    print(f"Not recording {arn} of {target['name']} as known-good: not seen healthy "
+                          f"(no metrics, an open threshold breach or an unpromoted canary)")
+        except Exception as e:
+            print(f"Error recording known-good task definitions: {e}")
+    
+    def rollback_deployment(self, target=None):
         """Trigger rollback to previous version"""
+        target = target or self.targets[0]
+        with self.telemetry.span('rollback', service=target['name']):
+            return self.start_rollback(target)
+    
+    def start_rollback(self, target):
+        """Point the service at its rollback revision and start tracking the recovery"""
+        key = service_key(target)
         try:
-            # Get previous task definition
-            task_definitions = self.ecs.list_task_definitions(
-                familyPrefix='cartoon-task-definition',
-                status='ACTIVE',
-                sort='DESC'
-            )
+            previous_task_def = self.rollback_targets.get(key)
+            if not previous_task_def:
+                # Nothing was preloaded, so resolve it now on the slow path
+                current = self.current_task_definitions.get(key) or self.describe_task_definitions().get(key)
+                if current:
+                    previous_task_def = (self.task_index.rollback_candidate(target, current)
+                                         or self.previous_revision(current))
             
-            if len(task_definitions['taskDefinitionArns']) < 2:
+            if not previous_task_def:
                 print("No previous version available for rollback")
                 return False
             
-            previous_task_def = task_definitions['taskDefinitionArns'][1]
-            
             # Update service to previous task definition
+            started = time.monotonic()
             self.ecs.update_service(
-                cluster='cartoon-cluster',
-                service='cartoon-web-service',
+                cluster=target['cluster'],
+                service=target['service'],
                 taskDefinition=previous_task_def
             )
             
             print(f"Rollback initiated to: {previous_task_def}")
+            thread = threading.Thread(
+                target=self.track_recovery, args=(target, previous_task_def, started), daemon=True
+            )
+            thread.start()
+            self.recovery_threads.append(thread)
             return True
             
         except Exception as e:
             print(f"Error during rollback: {e}")
             return False
     
-    def monitor(self, duration_minutes=30):
-        """Main monitoring loop"""
-        print(f"Starting deployment monitoring for {duration_minutes} minutes...")
-        
-        start_time = datetime.utcnow()
-        end_time = start_time + timedelta(minutes=duration_minutes)
-        
-        while datetime.utcnow() < end_time:
+    def track_recovery(self, target, task_definition, started, timeout=900, poll_interval=10):
+        """Follow a rollback until the service is steady on the target revision"""
+        name = target['name']
+        while time.monotonic() - started < timeout:
             try:
-                # Get current metrics
-                metrics = self.get_current_metrics()
-                if not metrics:
-                    time.sleep(60)
-                    continue
+                service = self.ecs.describe_services(
+                    cluster=target['cluster'], services=[target['service']]
+                )['services'][0]
+                deployments = service['deployments']
+                primary = next(d for d in deployments if d['status'] == 'PRIMARY')
                 
-                print(f"[{datetime.utcnow()}] Monitoring - Error: {metrics['error_rate']:.1f}%, CPU: {metrics['cpu_usage']:.1f}%, Memory: {metrics['memory_usage']:.1f}%")
-                
-                # Check thresholds
-                threshold_alerts = self.check_thresholds(metrics)
-                if threshold_alerts:
-                    alert_message = "Threshold exceeded:\n" + "\n".join(threshold_alerts)
-                    self.send_alert(alert_message, "WARNING")
-                
-                # AI anomaly detection
-                anomaly_analysis = self.detect_anomalies(metrics)
-                if anomaly_analysis and anomaly_analysis.get('anomaly_detected'):
-                    severity = anomaly_analysis.get('severity', 'MEDIUM')
-                    causes = anomaly_analysis.get('causes', [])
-                    recommendations = anomaly_analysis.get('recommendations', [])
-                    rollback_recommended = anomaly_analysis.get('rollback_recommended', False)
-                    
-                    alert_message = f"""
-Anomaly detected!
+                if primary.get('rolloutState') == 'FAILED':
+                    break
+                if (primary['taskDefinition'] == task_definition and len(deployments) == 1
+                        and primary['runningCount'] >= primary['desiredCount']):
+                    time_to_recover = time.monotonic() - started
+                    self.recoveries.append({
+                        'service': name,
+                        'task_definition': task_definition,
+                        'recovered': True,
+                        'time_to_recover': time_to_recover
+                    })
+                    self.send_alert(f"✅ {name} recovered on {task_definition} in {time_to_recover:.0f}s", "INFO")
+                    return
+            except Exception as e:
+                print(f"Error tracking rollback of {name}: {e}")
+            
+            time.sleep(poll_interval)
+        
+        self.recoveries.append({
+            'service': name,
+            'task_definition': task_definition,
+            'recovered': False,
+            'time_to_recover': None
+        })
+        self.send_alert(f"❌ {name} did not reach steady state after rollback - Manual intervention required", "CRITICAL")
+    
+    def wait_for_recoveries(self, timeout=900):
+        """Wait for rollback tracking to finish"""
+        deadline = time.monotonic() + timeout
+        for thread in self.recovery_threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+    
+    def run_tick(self, rolled_back):
+        """Fetch, evaluate and act on one round of metrics, returning the threshold pressure"""
+        try:
+            with self.telemetry.span('tick'):
+                return self.evaluate_tick(rolled_back)
+        finally:
+            self.telemetry.flush()
+    
+    def evaluate_tick(self, rolled_back):
+        """One monitoring tick: fetch metrics, check thresholds and anomalies, alert and roll back"""
+        metrics = self.get_current_metrics()
+        if not metrics:
+            return None
+        
+        # Polls faster than the metric period re-read the same datapoint. Only a newer one is a
+        # new sample for the history and the detector; thresholds are still checked every tick.
+        new_sample = metrics['datapoint_time'] is not None and (
+            self.last_datapoint_time is None or metrics['datapoint_time'] > self.last_datapoint_time)
+        observed = metrics['observed']
+        if new_sample:
+            self.last_datapoint_time = metrics['datapoint_time']
+            self.record_metrics(metrics)
+            self.observed_ticks += observed
+        breached = np.any(metrics['values'] > self.threshold_limits(), axis=1)
+        self.breaching = np.where(observed, breached, self.breaching)
+        worst = dict(zip(METRIC_NAMES, metrics['values'].max(axis=0)))
+        print(f"[{datetime.utcnow()}] Monitoring {len(self.targets)} service(s) - Error: {worst['error_rate']:.1f}%, p99: {worst['p99_latency']:.0f}ms, CPU: {worst['cpu_usage']:.1f}%, Memory: {worst['memory_usage']:.1f}%")
+        
+        # Check thresholds
+        threshold_alerts = self.check_thresholds(metrics)
+        if threshold_alerts:
+            alert_message = "Threshold exceeded:\n" + "\n".join(threshold_alerts)
+            self.send_alert(alert_message, "WARNING")
+        
+        # Local anomaly detection, with AI analysis of flagged services
+        for anomaly_analysis in (self.detect_anomalies(metrics) if new_sample else []):
+            if not anomaly_analysis.get('anomaly_detected') or anomaly_analysis['service_index'] in rolled_back:
+                continue
+            
+            service = anomaly_analysis['service']
+            severity = anomaly_analysis.get('severity', 'MEDIUM')
+            causes = anomaly_analysis.get('causes', [])
+            recommendations = anomaly_analysis.get('recommendations', [])
+            rollback_recommended = anomaly_analysis.get('rollback_recommended', False)
+            
+            alert_message = f"""
+Anomaly detected in {service}!
 Severity: {severity}
 Causes: {', '.join(causes)}
 Recommendations: {', '.join(recommendations)}
 Rollback recommended: {rollback_recommended}
-                    """
-                    
-                    self.send_alert(alert_message, severity)
-                    
-                    # Auto-rollback for critical issues
-                    if severity == "CRITICAL" and rollback_recommended:
-                        self.send_alert("🚨 CRITICAL ANOMALY DETECTED - Initiating automatic rollback", "CRITICAL")
-                        if self.rollback_deployment():
-                            self.send_alert("✅ Rollback completed successfully", "INFO")
-                        else:
-                            self.send_alert("❌ Rollback failed - Manual intervention required", "CRITICAL")
-                        break
-                
-                time.sleep(60)  # Check every minute
-                
-            except KeyboardInterrupt:
-                print("Monitoring stopped by user")
-                break
+            """
+            
+            self.send_alert(alert_message, severity)
+            
+            # Auto-rollback for critical issues
+            if severity == "CRITICAL" and rollback_recommended:
+                self.send_alert(f"🚨 CRITICAL ANOMALY DETECTED in {service} - Initiating automatic rollback", "CRITICAL")
+                if self.rollback_deployment(self.targets[anomaly_analysis['service_index']]):
+                    self.send_alert(f"↩️ Rollback of {service} initiated - tracking until steady state", "INFO")
+                else:
+                    self.send_alert(f"❌ Rollback of {service} failed - Manual intervention required", "CRITICAL")
+                rolled_back.add(anomaly_analysis['service_index'])
+        
+        self.check_canaries(rolled_back)
+        return self.threshold_pressure(metrics)
+    
+    def check_canaries(self, rolled_back):
+        """Compare canary and baseline target groups, rolling back a canary that is worse"""
+        for index, analyzer in self.canary_analyzers.items():
+            if index in rolled_back:
+                continue
+            service = self.service_names[index]
+            try:
+                with self.telemetry.span('canary_analysis', service=service):
+                    result = analyzer.analyze()
             except Exception as e:
-                print(f"Error in monitoring loop: {e}")
-                time.sleep(60)
+                print(f"Error in canary analysis of {service}: {e}")
+                continue
+            
+            previous = self.canary_results.get(index)
+            self.canary_results[index] = result
+            if result['verdict'] == ROLLBACK:
+                self.send_alert(f"🚨 Canary of {service} is worse than the baseline "
+                                f"({', '.join(result['reasons'])}, confidence {result['confidence']:.2f}) - "
+                                f"Initiating automatic rollback", "CRITICAL")
+                if not self.rollback_deployment(self.targets[index]):
+                    self.send_alert(f"❌ Rollback of {service} failed - Manual intervention required", "CRITICAL")
+                rolled_back.add(index)
+            elif result['verdict'] == PROMOTE and (previous is None or previous['verdict'] != PROMOTE):
+                self.send_alert(f"✅ Canary of {service} matches the baseline after {result['windows']} minutes "
+                                f"(confidence {result['confidence']:.2f}) - safe to promote", "INFO")
+    
+    def monitor(self, duration_minutes=30, webhook_port=None):
+        """Main monitoring loop"""
+        try:
+            asyncio.run(self.monitor_async(duration_minutes, webhook_port))
+        except KeyboardInterrupt:
+            print("Monitoring stopped by user")
+        finally:
+            if self.alert_dispatcher:
+                self.alert_dispatcher.close()
+            self.telemetry.flush(force=True)
         
         print("Monitoring completed")
+        print(f"Telemetry:\n{self.telemetry.report()}")
+    
+    async def monitor_async(self, duration_minutes=30, webhook_port=None):
+        """Adaptive monitoring loop that also reacts to events pushed to a local webhook"""
+        print(f"Starting deployment monitoring of {len(self.targets)} service(s) for {duration_minutes} minutes...")
+        
+        deadline = time.monotonic() + duration_minutes * 60
+        # Build the AWS clients here: the three startup threads would otherwise race to create
+        # them, and each swallows its errors, leaving a zero baseline or an unprimed detector
+        self.cloudwatch, self.ecs
+        await asyncio.gather(
+            asyncio.to_thread(lambda: self.baseline_metrics),
+            asyncio.to_thread(self.prime_anomaly_detector),
+            asyncio.to_thread(self.preload_rollback_targets)
+        )
+        
+        # Monitoring starts right after a rollout, so begin in the fast-polling window
+        self.poller.mark_deployment()
+        rate_limiter = TokenBucket(self.max_polls_per_second)
+        events = asyncio.Queue(maxsize=100)
+        listener = None
+        if webhook_port is not None:
+            listener = await WebhookListener(events, port=webhook_port).start()
+            print(f"Listening for deployment events on http://127.0.0.1:{listener.port}/")
+        
+        rolled_back = set()
+        try:
+            while time.monotonic() < deadline and len(rolled_back) < len(self.targets):
+                await rate_limiter.acquire()
+                try:
+                    # Fetching and evaluation block, so keep them off the event loop
+                    pressure = await asyncio.to_thread(self.run_tick, rolled_back)
+                except Exception as e:
+                    print(f"Error in monitoring loop: {e}")
+                    pressure = None
+                
+                if len(rolled_back) >= len(self.targets):
+                    break
+                
+                if pressure is None:
+                    delay = self.poller.base_interval
+                else:
+                    delay = self.poller.next_interval(pressure)
+                delay = max(0.0, min(delay, deadline - time.monotonic()))
+                
+                # Sleep until the next poll, waking early for pushed events
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=delay)
+                except asyncio.TimeoutError:
+                    continue
+                
+                if is_deployment_event(event):
+                    print(f"[{datetime.utcnow()}] Deployment event received - polling at {self.poller.min_interval}s")
+                    self.poller.mark_deployment()
+                else:
+                    print(f"[{datetime.utcnow()}] Event received - polling now")
+            
+            # Revisions that made it through monitoring become rollback candidates next time
+            await asyncio.to_thread(self.record_known_good, rolled_back)
+            await asyncio.to_thread(self.wait_for_recoveries)
+            for recovery in self.recoveries:
+                print(f"Recovery of {recovery['service']}: {recovery}")
+        finally:
+            if listener:
+                await listener.stop()
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python3 monitor_deployment.py <duration_minutes> [slack_webhook_url]")
+        print("Usage: python3 monitor_deployment.py <duration_minutes> [slack_webhook_url] [targets_json]")
+        print("  targets_json: JSON list of {service, load_balancer[, name, cluster, task_family]} to monitor;")
+        print("                add target_group and canary_target_group to compare a canary with its baseline")
+        print("  MONITOR_WEBHOOK_PORT: optional local port accepting POSTed deployment events (JSON)")
+        print("  MONITOR_TELEMETRY: optional exporters, e.g. prometheus=monitor.prom,ndjson=trace.ndjson,emf=emf.log")
         sys.exit(1)
     
     duration_minutes = int(sys.argv[1])
-    slack_webhook_url = sys.argv[2] if len(sys.argv) > 2 else os.getenv('SLACK_WEBHOOK_URL')
+    slack_webhook_url = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else os.getenv('SLACK_WEBHOOK_URL')
+    targets_path = sys.argv[3] if len(sys.argv) > 3 else os.getenv('MONITOR_TARGETS_FILE')
+    webhook_port = os.getenv('MONITOR_WEBHOOK_PORT')
     openai_api_key = os.getenv('OPENAI_API_KEY')
     
     if not openai_api_key:
         print("Error: OPENAI_API_KEY environment variable not set")
         sys.exit(1)
     
-    monitor = DeploymentMonitor(openai_api_key, slack_webhook_url)
-    monitor.monitor(duration_minutes)
+    targets = load_targets(targets_path) if targets_path else None
+    telemetry = telemetry_from_spec(os.getenv('MONITOR_TELEMETRY'))
+    monitor = DeploymentMonitor(openai_api_key, slack_webhook_url, targets=targets, telemetry=telemetry)
+    monitor.monitor(duration_minutes, int(webhook_port) if webhook_port else None)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Image optimization build step: recompressed originals, WebP/AVIF variants and responsive sizes
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, features
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE = os.path.join(REPO_DIR, 'src', 'assets')
+# Served by nginx from the React build, which copies public/ as is
+DEFAULT_OUTPUT = os.path.join(REPO_DIR, 'public', 'optimized')
+MANIFEST_NAME = 'manifest.json'
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'}
+# Other files reported against the budget but left alone
+REPORTED_EXTENSIONS = {'.svg', '.gif', '.ttf', '.woff', '.woff2'}
+RESPONSIVE_WIDTHS = (480, 960, 1440, 1920)
+
+# Part of every content hash, so changing a setting reprocesses everything
+SETTINGS = {
+    'widths': RESPONSIVE_WIDTHS,
+    'webp': {'quality': 80, 'method': 6},
+    'avif': {'quality': 55, 'speed': 6},
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True}
+}
+
+# Page-weight budget for a single asset, and the links its download time is estimated on
+ASSET_BUDGET_KB = 200
+LINKS = {'slow-4g': (1.6e6, 0.15), 'cable': (20e6, 0.02)}  # bits per second, round trip seconds
+
+def content_hash(path):
+    """SHA-256 of the file and the optimization settings"""
+    digest = hashlib.sha256(json.dumps(SETTINGS, sort_keys=True).encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_seconds(size, link):
+    bandwidth, round_trip = LINKS[link]
+    return round_trip + size * 8 / bandwidth
+
+def encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+def optimize_image(source, relative, digest, output_dir, avif):
+    """Write every variant of one image; runs in a worker process"""
+    started = time.perf_counter()
+    original_bytes = os.path.getsize(source)
+    stem, extension = os.path.splitext(relative)
+    # Content hash in the name: a changed image gets a new URL, so 'immutable' caching is safe
+    prefix = f"{stem}.{digest[:10]}"
+    variants = []
+    
+    def write(data, suffix, fmt, width):
+        path = f"{prefix}.{suffix}"
+        target = os.path.join(output_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        variants[:] = [v for v in variants if v['path'] != path]
+        variants.append({'path': path, 'format': fmt, 'width': width, 'bytes': len(data)})
+    
+    with Image.open(source) as image:
+        image.load()
+        width, height = image.size
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        with open(source, 'rb') as f:
+            original = f.read()
+        # A WebP source has no separate fallback: its full-width WebP variant would share the path
+        webp_source = extension.lower() == '.webp'
+        
+        # Same format at full size as the fallback, kept only if recompression helped
+        if not webp_source:
+            if extension.lower() in ('.jpg', '.jpeg'):
+                recompressed = encode(image.convert('RGB'), 'JPEG', **SETTINGS['jpeg'])
+            else:
+                recompressed = encode(image, 'PNG', **SETTINGS['png'])
+            if len(recompressed) >= original_bytes:
+                recompressed = original
+            write(recompressed, f"{width}w{extension.lower()}", extension.lower().lstrip('.'), width)
+        
+        converted = image.convert('RGBA' if has_alpha else 'RGB')
+        for size in [w for w in RESPONSIVE_WIDTHS if w < width] + [width]:
+            resized = converted
+            if size < width:
+                resized = converted.resize((size, max(1, round(height * size / width))), Image.LANCZOS)
+            webp = encode(resized, 'WEBP', **SETTINGS['webp'])
+            if webp_source and size == width and len(webp) >= original_bytes:
+                webp = original
+            write(webp, f"{size}w.webp", 'webp', size)
+            if avif:
+                write(encode(resized, 'AVIF', **SETTINGS['avif']), f"{size}w.avif", 'avif', size)
+    
+    full_size = [v for v in variants if v['width'] == width]
+    best = min(full_size, key=lambda v: v['bytes'])
+    return {
+        'source': relative,
+        'hash': digest,
+        'width': width,
+        'height': height,
+        'bytes': original_bytes,
+        'best': best['path'],
+        'best_bytes': best['bytes'],
+        'saved_bytes': original_bytes - best['bytes'],
+        'variants': variants,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+class AssetOptimizer:
+    """Optimizes the images under a source directory in parallel, reusing results of unchanged files"""
+    def __init__(self, source_dir=DEFAULT_SOURCE, output_dir=DEFAULT_OUTPUT, workers=None):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count()
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.avif = features.check('avif')
+    
+    def scan(self):
+        """Relative paths of the images and of other budgeted files under the source directory"""
+        images, others = [], []
+        for root, _, files in os.walk(self.source_dir):
+            for name in sorted(files):
+                relative = os.path.relpath(os.path.join(root, name), self.source_dir)
+                extension = os.path.splitext(name)[1].lower()
+                if extension in IMAGE_EXTENSIONS:
+                    images.append(relative)
+                elif extension in REPORTED_EXTENSIONS:
+                    others.append(relative)
+        return sorted(images), sorted(others)
+    
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'assets': {}}
+    
+    def cached(self, entry, digest):
+        """Whether a previous manifest entry still describes the file and its outputs exist"""
+        # Entries listing a path twice predate the WebP fallback fix and recorded the wrong size
+        paths = [v['path'] for v in entry['variants']] if entry is not None else []
+        return (entry is not None and entry['hash'] == digest and len(set(paths)) == len(paths) and
+                all(os.path.exists(os.path.join(self.output_dir, path)) for path in paths))
+    
+    def run(self):
+        """Optimize changed images and write the manifest; returns it"""
+        started = time.perf_counter()
+        images, others = self.scan()
+        previous = self.load_manifest()['assets']
+        assets, errors = {}, {}
+        pending = []
+        
+        for relative in images:
+            digest = content_hash(os.path.join(self.source_dir, relative))
+            if self.cached(previous.get(relative), digest):
+                assets[relative] = previous[relative]
+            else:
+                pending.append((relative, digest))
+        
+        if pending:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                futures = {
+                    pool.submit(optimize_image, os.path.join(self.source_dir, relative), relative, digest,
+                                self.output_dir, self.avif): relative
+                    for relative, digest in pending
+                }
+                for future in as_completed(futures):
+                    relative = futures[future]
+                    try:
+                        assets[relative] = future.result()
+                    except Exception as e:
+                        errors[relative] = str(e)
+                        print(f"Error optimizing {relative}: {e}")
+        
+        self.remove_stale(previous, assets)
+        unprocessed = {relative: os.path.getsize(os.path.join(self.source_dir, relative)) for relative in others}
+        manifest = {
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'avif': self.avif,
+            'processed': len(pending) - len(errors),
+            'reused': len(images) - len(pending),
+            'seconds': round(time.perf_counter() - started, 2),
+            'original_bytes': sum(a['bytes'] for a in assets.values()),
+            'optimized_bytes': sum(a['best_bytes'] for a in assets.values()),
+            'assets': dict(sorted(assets.items())),
+            'unprocessed': unprocessed,
+            'errors': errors
+        }
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        temporary = f"{self.manifest_path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, self.manifest_path)
+        return manifest
+    
+    def remove_stale(self, previous, assets):
+        """Delete outputs of earlier runs that no current asset refers to"""
+        current = {v['path'] for asset in assets.values() for v in asset['variants']}
+        for asset in previous.values():
+            for variant in asset['variants']:
+                if variant['path'] not in current:
+                    try:
+                        os.remove(os.path.join(self.output_dir, variant['path']))
+                    except FileNotFoundError:
+                        pass
+
+def budget_report(manifest, budget_kb=ASSET_BUDGET_KB):
+    """Lines summarizing savings and the assets still over the per-asset budget"""
+    original, optimized = manifest['original_bytes'], manifest['optimized_bytes']
+    lines = [f"Images: {len(manifest['assets'])} ({manifest['processed']} processed, {manifest['reused']} unchanged) "
+             f"in {manifest['seconds']}s",
+             f"Bytes: {original / 1024:.0f}KB -> {optimized / 1024:.0f}KB "
+             f"({100 * (original - optimized) / max(original, 1):.0f}% saved)"]
+    for link in LINKS:
+        lines.append(f"All images on {link}: {download_seconds(original, link):.1f}s -> "
+                     f"{download_seconds(optimized, link):.1f}s")
+    
+    over = [(a['best_bytes'], a['best']) for a in manifest['assets'].values()]
+    over += [(size, f"{relative} (not optimized)") for relative, size in manifest['unprocessed'].items()]
+    over = sorted((item for item in over if item[0] > budget_kb * 1024), reverse=True)
+    if over:
+        lines.append(f"Over the {budget_kb}KB budget:")
+        for size, path in over:
+            lines.append(f"  {path}: {size / 1024:.0f}KB, {download_seconds(size, 'slow-4g'):.1f}s on slow-4g")
+    return lines
+
+def main():
+    # Usage: python3 optimize_assets.py [source_dir] [output_dir] [workers]
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOURCE
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_OUTPUT
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    
+    if not os.path.isdir(source_dir):
+        print(f"Error: {source_dir} is not a directory")
+        sys.exit(1)
+    
+    manifest = AssetOptimizer(source_dir, output_dir, workers).run()
+    print('\n'.join(budget_report(manifest)))
+    if not manifest['avif']:
+        print("Note: this Pillow build has no AVIF support, only WebP variants were written")
+    sys.exit(1 if manifest['errors'] else 0)
+
+if __name__ == "__main__":
+    main()
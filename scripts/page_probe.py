@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Synthetic page-load probe: fetches the full asset graph of the served app like a browser
+"""
+
+import json
+import posixpath
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+# Browsers open about six connections per host
+BROWSER_CONNECTIONS = 6
+# A full page (bytes over the wire) and load time that count as a regression when exceeded
+PAGE_BUDGET_KB = 6000
+PAGE_BUDGET_MS = 5000
+
+KINDS = {
+    'script': {'.js'},
+    'stylesheet': {'.css'},
+    'font': {'.woff', '.woff2', '.ttf', '.otf', '.eot'},
+    'image': {'.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.ico'},
+    'data': {'.json'}
+}
+# Text responses nginx should send compressed (gzip_min_length 1024)
+COMPRESSIBLE_KINDS = {'document', 'script', 'stylesheet', 'data'}
+COMPRESS_MIN_BYTES = 1024
+# Paths nginx.conf gives 'expires 1y' and 'Cache-Control: public, immutable'
+LONG_CACHE = re.compile(r'\.(js|css|png|jpg|jpeg|gif|ico|svg|webp|avif|woff|woff2|ttf|otf)$', re.IGNORECASE)
+CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+def asset_kind(url):
+    extension = posixpath.splitext(urlsplit(url).path)[1].lower()
+    for kind, extensions in KINDS.items():
+        if extension in extensions:
+            return kind
+    return 'other'
+
+class AssetParser(HTMLParser):
+    """Collects the URLs an HTML document makes the browser fetch"""
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('src'):
+            self.urls.append(attrs['src'])
+        elif tag == 'link' and attrs.get('href'):
+            rel = (attrs.get('rel') or '').lower().split()
+            if {'stylesheet', 'preload', 'modulepreload', 'icon', 'apple-touch-icon', 'manifest'} & set(rel):
+                self.urls.append(attrs['href'])
+        elif tag in ('img', 'source'):
+            if attrs.get('src'):
+                self.urls.append(attrs['src'])
+            for candidate in (attrs.get('srcset') or '').split(','):
+                if candidate.strip():
+                    self.urls.append(candidate.split()[0])
+
+class PageProbe:
+    """Loads index.html, then every script, stylesheet, font and image it leads to, concurrently"""
+    # Each asset is requested as soon as the response that references it has arrived, so
+    # the timeline follows the dependency chain (HTML -> CSS -> fonts) a browser walks.
+    def __init__(self, base_url, session, timeout=10, connections=BROWSER_CONNECTIONS):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.session = session
+        self.timeout = timeout
+        self.connections = connections
+    
+    def fetch(self, url, kind, parent, started):
+        """GET one asset, recording wire and decoded size, timing and cache/encoding headers"""
+        result = {'url': url, 'kind': kind, 'parent': parent,
+                  'start_ms': (time.perf_counter() - started) * 1000}
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                result['ttfb_ms'] = (time.perf_counter() - started) * 1000 - result['start_ms']
+                body = response.content
+                result.update({
+                    'status_code': response.status_code,
+                    'success': 200 <= response.status_code < 400,
+                    # Bytes read off the socket, i.e. after content encoding
+                    'bytes': response.raw.tell() or len(body),
+                    'decoded_bytes': len(body),
+                    'content_encoding': response.headers.get('Content-Encoding'),
+                    'cache_control': response.headers.get('Cache-Control'),
+                    'vary': response.headers.get('Vary'),
+                    'content_type': response.headers.get('Content-Type', '')
+                })
+            # nginx answers unknown paths with index.html (try_files), so a missing asset is a 200
+            if kind != 'document' and result['success'] and 'text/html' in result['content_type']:
+                result.update(success=False, error='missing (served index.html instead)')
+        except Exception as e:
+            body = b''
+            result.update({'status_code': None, 'success': False, 'error': str(e), 'bytes': 0, 'decoded_bytes': 0})
+        result['end_ms'] = (time.perf_counter() - started) * 1000
+        result['issues'] = self.header_issues(result) if result['success'] else []
+        return result, body
+    
+    def header_issues(self, result):
+        """Differences from what nginx.conf is meant to send for this asset"""
+        issues = []
+        kind = result['kind']
+        cache_control = (result['cache_control'] or '').lower()
+        encoding = (result['content_encoding'] or '').lower()
+        
+        if kind in COMPRESSIBLE_KINDS and result['decoded_bytes'] >= COMPRESS_MIN_BYTES:
+            if encoding not in ('gzip', 'br'):
+                issues.append('not compressed')
+            elif 'accept-encoding' not in (result['vary'] or '').lower():
+                issues.append('compressed without Vary: Accept-Encoding')
+        
+        if kind == 'document':
+            if 'immutable' in cache_control:
+                issues.append('index.html cached as immutable')
+        elif LONG_CACHE.search(urlsplit(result['url']).path):
+            if 'max-age' not in cache_control or 'immutable' not in cache_control:
+                issues.append(f"no long-lived immutable caching (Cache-Control: {result['cache_control']})")
+        return issues
+    
+    def references(self, result, body):
+        """Absolute URLs referenced by a fetched document, manifest or stylesheet"""
+        if not result['success'] or not body:
+            return []
+        text = body.decode('utf-8', errors='replace')
+        if result['kind'] == 'document':
+            parser = AssetParser()
+            parser.feed(text)
+            urls = parser.urls
+        elif result['kind'] == 'stylesheet':
+            urls = [url for url in CSS_URL.findall(text) if not url.startswith('data:')]
+        elif result['kind'] == 'manifest':
+            try:
+                files = json.loads(text).get('files', {}).values()
+            except ValueError:
+                files = []
+            urls = [url for url in files if not url.endswith(('.map', '.html', '.txt'))]
+        else:
+            urls = []
+        
+        # Only same-origin assets; third-party hosts are outside what this deploy controls
+        origin = urlsplit(self.base_url)[:2]
+        absolute = (urljoin(result['url'], url) for url in urls)
+        return [url.split('#')[0] for url in absolute if urlsplit(url)[:2] == origin]
+    
+    def run(self):
+        """Load the page and return per-asset results with totals and the critical path"""
+        started = time.perf_counter()
+        seen = set()
+        assets = []
+        
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            pending = set()
+            
+            def submit(url, kind, parent):
+                if url not in seen:
+                    seen.add(url)
+                    pending.add(executor.submit(self.fetch, url, kind, parent, started))
+            
+            submit(self.base_url, 'document', None)
+            # The build's manifest lists chunks the HTML only loads later (code splitting)
+            submit(urljoin(self.base_url, 'asset-manifest.json'), 'manifest', None)
+            # A browser can only find those chunks through the document, so they wait for it to be
+            # parsed and count as its children; the manifest itself never joins the dependency chain
+            deferred = []
+            document_parsed = False
+            
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, body = future.result()
+                    assets.append(result)
+                    if result['kind'] == 'manifest':
+                        deferred.extend(self.references(result, body))
+                    else:
+                        for url in self.references(result, body):
+                            submit(url, asset_kind(url), result['url'])
+                    document_parsed = document_parsed or result['kind'] == 'document'
+                    if document_parsed:
+                        for url in deferred:
+                            submit(url, asset_kind(url), self.base_url)
+                        deferred = []
+        
+        return self.summary(assets, (time.perf_counter() - started) * 1000)
+    
+    def summary(self, assets, load_ms):
+        # The build manifest is how the probe finds assets; a browser never downloads it
+        manifest = [asset for asset in assets if asset['kind'] == 'manifest']
+        assets = [asset for asset in assets if asset['kind'] != 'manifest']
+        by_url = {asset['url']: asset for asset in assets}
+        # Walk back from the asset that finished last through the assets that referenced it
+        path = []
+        current = max(assets, key=lambda asset: asset['end_ms'])
+        while current is not None:
+            path.append(current)
+            current = by_url.get(current['parent'])
+        
+        by_kind = {}
+        for asset in assets:
+            stats = by_kind.setdefault(asset['kind'], {'requests': 0, 'bytes': 0, 'decoded_bytes': 0})
+            stats['requests'] += 1
+            stats['bytes'] += asset['bytes']
+            stats['decoded_bytes'] += asset['decoded_bytes']
+        
+        return {
+            'base_url': self.base_url,
+            'asset_manifest': bool(manifest and manifest[0]['success']),
+            'load_ms': load_ms,
+            'requests': len(assets),
+            'bytes': sum(asset['bytes'] for asset in assets),
+            'decoded_bytes': sum(asset['decoded_bytes'] for asset in assets),
+            'failed': [asset['url'] for asset in assets if not asset['success']],
+            'by_kind': by_kind,
+            'critical_path': [{'url': asset['url'], 'kind': asset['kind'], 'start_ms': asset['start_ms'],
+                               'end_ms': asset['end_ms']} for asset in reversed(path)],
+            'issues': {asset['url']: asset['issues'] for asset in assets if asset['issues']},
+            'assets': sorted(assets, key=lambda asset: asset['start_ms'])
+        }
+
+def budget_failures(summary, max_kb=PAGE_BUDGET_KB, max_ms=PAGE_BUDGET_MS):
+    """Reasons the page load counts as a regression"""
+    failures = [f"failed to load {url}" for url in summary['failed']]
+    if summary['bytes'] > max_kb * 1024:
+        failures.append(f"page weight {summary['bytes'] / 1024:.0f}KB exceeds the {max_kb}KB budget")
+    if summary['load_ms'] > max_ms:
+        failures.append(f"load time {summary['load_ms']:.0f}ms exceeds the {max_ms}ms budget")
+    return failures
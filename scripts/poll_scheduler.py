@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Adaptive polling, rate limiting and pushed-event intake for the deployment monitor
+"""
+
+import asyncio
+import json
+import time
+
+class AdaptivePoller:
+    """Chooses the delay before the next metrics poll"""
+    def __init__(self, min_interval=10, base_interval=60, max_interval=180,
+                 deploy_window=600, pressure_threshold=0.8):
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.deploy_window = deploy_window
+        self.pressure_threshold = pressure_threshold
+        self.interval = base_interval
+        self.deployed_at = None
+    
+    def mark_deployment(self, when=None):
+        """Start the fast-polling window that follows a deployment"""
+        self.deployed_at = time.monotonic() if when is None else when
+        self.interval = self.min_interval
+    
+    def in_deploy_window(self):
+        return self.deployed_at is not None and time.monotonic() - self.deployed_at < self.deploy_window
+    
+    def next_interval(self, pressure):
+        """Seconds to wait, given how close the metrics are to their thresholds (1.0 = at threshold)"""
+        if self.in_deploy_window() or pressure >= self.pressure_threshold:
+            self.interval = self.min_interval
+        else:
+            # Back off gradually while things are stable
+            self.interval = min(self.max_interval, max(self.interval * 2, self.base_interval))
+        return self.interval
+
+class TokenBucket:
+    """Async token bucket keeping API calls under a per-second rate"""
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self, tokens=1):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+class WebhookListener:
+    """Minimal local HTTP endpoint that queues JSON events POSTed to it"""
+    def __init__(self, events, host='127.0.0.1', port=8787):
+        self.events = events
+        self.host = host
+        self.port = port
+        self.server = None
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+    
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+    
+    async def handle(self, reader, writer):
+        status = '202 Accepted'
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            if not request_line.startswith(b'POST'):
+                status = '405 Method Not Allowed'
+            else:
+                event = json.loads(body or b'{}')
+                if not isinstance(event, dict):
+                    raise ValueError("event must be a JSON object")
+                self.events.put_nowait(event)
+        except (ValueError, asyncio.IncompleteReadError):
+            status = '400 Bad Request'
+        except asyncio.QueueFull:
+            status = '503 Service Unavailable'
+        
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        writer.close()
+
+def is_deployment_event(event):
+    """Whether an event (e.g. EventBridge "ECS Deployment State Change") marks a new rollout"""
+    # Events are arbitrary POSTed JSON, so malformed ones are simply not deployment events
+    if not isinstance(event, dict):
+        return False
+    detail = event.get('detail')
+    if not isinstance(detail, dict):
+        detail = {}
+    return (event.get('detail-type') == 'ECS Deployment State Change'
+            and detail.get('eventName') == 'SERVICE_DEPLOYMENT_IN_PROGRESS') or event.get('type') == 'deployment'
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Post-build pre-compression of the React build for nginx gzip_static
+"""
+
+import gzip
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUILD = os.path.join(REPO_DIR, 'build')
+SNIPPET_NAME = 'nginx-precompressed.conf'
+
+# Text types nginx would otherwise gzip per response, plus uncompressed font formats
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.json', '.map', '.svg', '.txt', '.xml', '.ico',
+                           '.ttf', '.otf', '.eot'}
+# Matches gzip_min_length in nginx.conf; smaller files are not worth a second copy
+MIN_SIZE = 1024
+
+SNIPPET = """# Generated by scripts/precompress_build.py - serve the .gz copies written next to
+# each build file instead of compressing them on every response.
+gzip_static on;
+
+# The .br copies need the ngx_brotli module, which nginx:alpine does not include:
+# brotli_static on;
+"""
+
+def up_to_date(source, compressed):
+    """A compressed copy is current if it carries the source's mtime, which compress() gives it"""
+    try:
+        return os.stat(compressed).st_mtime_ns == os.stat(source).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def compress(path, encodings):
+    """Write the missing or stale compressed copies of one file; returns (path, suffixes written, size, sizes)"""
+    source = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    written = []
+    sizes = {}
+    for suffix in encodings:
+        target = f"{path}.{suffix}"
+        if up_to_date(path, target):
+            sizes[suffix] = os.path.getsize(target)
+            continue
+        
+        if suffix == 'gz':
+            # mtime=0 keeps the output byte-identical across builds
+            output = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            output = brotli.compress(data, quality=11)
+        
+        if len(output) >= len(data):
+            # Not smaller: let nginx serve the original
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(output)
+        os.utime(target, ns=(source.st_atime_ns, source.st_mtime_ns))
+        written.append(suffix)
+        sizes[suffix] = len(output)
+    return path, written, len(data), sizes
+
+def find_files(build_dir):
+    for root, _, files in os.walk(build_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if (os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+                    and os.path.getsize(path) >= MIN_SIZE):
+                yield path
+
+def precompress(build_dir, workers=None):
+    """Compress every eligible file under build_dir in parallel and return totals"""
+    started = time.perf_counter()
+    encodings = ['gz', 'br'] if brotli else ['gz']
+    paths = list(find_files(build_dir))
+    totals = {'files': len(paths), 'written': 0, 'bytes': 0, 'gz': 0, 'br': 0}
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for path, written, size, sizes in pool.map(compress, paths, [encodings] * len(paths), chunksize=4):
+            totals['written'] += len(written)
+            totals['bytes'] += size
+            for suffix in encodings:
+                totals[suffix] += sizes.get(suffix, size)
+    
+    totals['seconds'] = round(time.perf_counter() - started, 2)
+    return totals
+
+def write_snippet(directory):
+    path = os.path.join(directory, SNIPPET_NAME)
+    with open(path, 'w') as f:
+        f.write(SNIPPET)
+    return path
+
+def main():
+    # Usage: python3 precompress_build.py [build_dir] [nginx_conf_dir] [workers]
+    build_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BUILD
+    conf_dir = sys.argv[2] if len(sys.argv) > 2 else REPO_DIR
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    
+    if not os.path.isdir(build_dir):
+        print(f"Error: {build_dir} is not a directory - run 'npm run build' first")
+        sys.exit(1)
+    
+    totals = precompress(build_dir, workers)
+    snippet = write_snippet(conf_dir)
+    
+    print(f"Pre-compressed {totals['files']} files ({totals['written']} copies written) in {totals['seconds']}s")
+    print(f"   Original: {totals['bytes'] / 1024:.0f}KB")
+    print(f"   gzip -9:  {totals['gz'] / 1024:.0f}KB")
+    if brotli:
+        print(f"   brotli:   {totals['br'] / 1024:.0f}KB")
+    else:
+        print("   brotli:   skipped (pip install brotli to also write .br copies)")
+    print(f"nginx configuration: {snippet}")
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,86 @@
 Setup CloudWatch monitoring and alerting for the deployment
 """
 
-import boto3
 import json
 import sys
 import os
+import threading
+import time
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from lazy_loading import aws_client, lazy_attribute
+
+# Dashboard and alarm names are "<prefix>-Dashboard" and "<prefix>-<alarm>"
+DEFAULT_NAME_PREFIX = 'CartoonAnimationWeb'
+# describe_alarms accepts up to 100 alarm names per call
+DESCRIBE_ALARMS_BATCH = 100
+THROTTLING_ERRORS = {'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException'}
+# put_metric_alarm fields as they appear in describe_alarms output
+ALARM_FIELDS = [
+    'AlarmDescription', 'MetricName', 'Namespace', 'Dimensions', 'Statistic', 'Period',
+    'EvaluationPeriods', 'Threshold', 'ComparisonOperator', 'AlarmActions', 'OKActions', 'TreatMissingData'
+]
+
+def error_code(error):
+    """AWS error code of a botocore ClientError (or a stand-in with the same response shape)"""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+def alarm_diff(desired, current):
+    """Fields of an alarm that differ from its current definition, or all of them if it is missing"""
+    if current is None:
+        return list(ALARM_FIELDS)
+    
+    changed = []
+    for field in ALARM_FIELDS:
+        want, have = desired.get(field), current.get(field)
+        if field == 'Dimensions':
+            want = sorted((d['Name'], d['Value']) for d in want or [])
+            have = sorted((d['Name'], d['Value']) for d in have or [])
+        elif field in ('AlarmActions', 'OKActions'):
+            want, have = sorted(want or []), sorted(have or [])
+        elif field == 'Threshold':
+            want, have = float(want), float(have) if have is not None else None
+        if want != have:
+            changed.append(field)
+    return changed
 
 class MonitoringSetup:
-    def __init__(self, aws_region='us-east-1'):
+    def __init__(self, aws_region='us-east-1', max_parallel=3, max_retries=5, backoff=0.5,
+                 name_prefix=DEFAULT_NAME_PREFIX, cloudwatch=None, in_flight=None, label=None):
+        # Clients are created (and boto3 imported) only when first used
         self.aws_region = aws_region
-        self.cloudwatch = boto3.client('cloudwatch', region_name=aws_region)
-        self.sns = boto3.client('sns', region_name=aws_region)
-        self.ecs = boto3.client('ecs', region_name=aws_region)
-        self.alb = boto3.client('elbv2', region_name=aws_region)
+        self.max_parallel = max_parallel
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.name_prefix = name_prefix
+        self.dashboard_name = f'{name_prefix}-Dashboard'
+        # Shared by every environment in a region to cap its concurrent API requests
+        self.in_flight = in_flight
+        self.label = label
+        self.api_calls = 0
+        self.lock = threading.Lock()
+        if cloudwatch is not None:
+            self.cloudwatch = cloudwatch
     
-    def create_dashboard(self, cluster_name, service_name, alb_name):
-        """Create CloudWatch dashboard for monitoring"""
-        dashboard_body = {
+    @lazy_attribute
+    def cloudwatch(self):
+        return aws_client('cloudwatch', self.aws_region)
+    
+    @lazy_attribute
+    def sns(self):
+        return aws_client('sns', self.aws_region)
+    
+    @lazy_attribute
+    def ecs(self):
+        return aws_client('ecs', self.aws_region)
+    
+    @lazy_attribute
+    def alb(self):
+        return aws_client('elbv2', self.aws_region)
+    
+    def dashboard_body(self, cluster_name, service_name, alb_name):
+        """Desired dashboard definition"""
+        return {
             "widgets": [
                 {
                     "type": "metric",
@@ -97,18 +160,22 @@ class MonitoringSetup:
                 }
             ]
         }
+    
+    def create_dashboard(self, cluster_name, service_name, alb_name):
+        """Create CloudWatch dashboard for monitoring"""
+        dashboard_body = self.dashboard_body(cluster_name, service_name, alb_name)
         
         try:
             self.cloudwatch.put_dashboard(
-                DashboardName='CartoonAnimationWeb-Dashboard',
+                DashboardName=self.dashboard_name,
                 DashboardBody=json.dumps(dashboard_body)
             )
             print("✅ CloudWatch dashboard created successfully")
         except Exception as e:
             print(f"❌ Error creating dashboard: {e}")
     
-    def create_alarms(self, cluster_name, service_name, alb_name, sns_topic_arn):
-        """Create CloudWatch alarms for monitoring"""
+    def alarm_definitions(self, cluster_name, service_name, alb_name, sns_topic_arn):
+        """Desired alarms as put_metric_alarm arguments"""
         alarms = [
             {
                 'name': 'High-CPU-Utilization',
@@ -179,26 +246,133 @@ class MonitoringSetup:
             }
         ]
         
-        for alarm in alarms:
+        # Without a topic the alarms are created with no actions
+        actions = [sns_topic_arn] if sns_topic_arn else []
+        return [
+            {
+                'AlarmName': f'{self.name_prefix}-{alarm["name"]}',
+                'AlarmDescription': alarm['description'],
+                'MetricName': alarm['metric'],
+                'Namespace': alarm['namespace'],
+                'Dimensions': alarm['dimensions'],
+                'Statistic': 'Average',
+                'Period': alarm['period'],
+                'EvaluationPeriods': alarm['evaluation_periods'],
+                'Threshold': alarm['threshold'],
+                'ComparisonOperator': alarm['comparison'],
+                'AlarmActions': actions,
+                'OKActions': actions,
+                'TreatMissingData': 'notBreaching'
+            }
+            for alarm in alarms
+        ]
+    
+    def create_alarms(self, cluster_name, service_name, alb_name, sns_topic_arn):
+        """Create CloudWatch alarms for monitoring"""
+        for alarm in self.alarm_definitions(cluster_name, service_name, alb_name, sns_topic_arn):
+            name = alarm['AlarmName'][len(self.name_prefix) + 1:]
             try:
-                self.cloudwatch.put_metric_alarm(
-                    AlarmName=f'CartoonAnimationWeb-{alarm["name"]}',
-                    AlarmDescription=alarm['description'],
-                    MetricName=alarm['metric'],
-                    Namespace=alarm['namespace'],
-                    Dimensions=alarm['dimensions'],
-                    Statistic='Average',
-                    Period=alarm['period'],
-                    EvaluationPeriods=alarm['evaluation_periods'],
-                    Threshold=alarm['threshold'],
-                    ComparisonOperator=alarm['comparison'],
-                    AlarmActions=[sns_topic_arn],
-                    OKActions=[sns_topic_arn],
-                    TreatMissingData='notBreaching'
-                )
-                print(f"✅ Alarm created: {alarm['name']}")
+                self.cloudwatch.put_metric_alarm(**alarm)
+                print(f"✅ Alarm created: {name}")
             except Exception as e:
-                print(f"❌ Error creating alarm {alarm['name']}: {e}")
+                print(f"❌ Error creating alarm {name}: {e}")
+    
+    def existing_alarms(self, alarm_names):
+        """Current definitions of the named alarms, fetched with as few describe_alarms calls as possible"""
+        existing = {}
+        for offset in range(0, len(alarm_names), DESCRIBE_ALARMS_BATCH):
+            kwargs = {'AlarmNames': alarm_names[offset:offset + DESCRIBE_ALARMS_BATCH],
+                      'MaxRecords': DESCRIBE_ALARMS_BATCH}
+            while True:
+                response = self.call(self.cloudwatch.describe_alarms, **kwargs)
+                for alarm in response.get('MetricAlarms', []):
+                    existing[alarm['AlarmName']] = alarm
+                if not response.get('NextToken'):
+                    break
+                kwargs['NextToken'] = response['NextToken']
+        return existing
+    
+    def existing_dashboard(self, dashboard_name):
+        """Current dashboard body, or None if the dashboard does not exist"""
+        try:
+            response = self.call(self.cloudwatch.get_dashboard, DashboardName=dashboard_name)
+        except Exception as e:
+            if error_code(e) in ('ResourceNotFound', 'ResourceNotFoundException'):
+                return None
+            raise
+        return json.loads(response['DashboardBody'])
+    
+    def call(self, operation, **kwargs):
+        """Make an AWS call, retrying throttling errors with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            with self.lock:
+                self.api_calls += 1
+            try:
+                if self.in_flight is None:
+                    return operation(**kwargs)
+                with self.in_flight:
+                    return operation(**kwargs)
+            except Exception as e:
+                if error_code(e) not in THROTTLING_ERRORS or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+    
+    def reconcile(self, cluster_name, service_name, alb_name, sns_topic_arn, dry_run=False):
+        """Bring the dashboard and alarms to their desired state, changing only what differs"""
+        changes = []
+        
+        desired_dashboard = self.dashboard_body(cluster_name, service_name, alb_name)
+        current_dashboard = self.existing_dashboard(self.dashboard_name)
+        if current_dashboard != desired_dashboard:
+            changes.append({
+                'resource': 'dashboard',
+                'name': self.dashboard_name,
+                'action': 'create' if current_dashboard is None else 'update',
+                'apply': lambda: self.call(self.cloudwatch.put_dashboard, DashboardName=self.dashboard_name,
+                                           DashboardBody=json.dumps(desired_dashboard))
+            })
+        
+        desired_alarms = self.alarm_definitions(cluster_name, service_name, alb_name, sns_topic_arn)
+        current_alarms = self.existing_alarms([alarm['AlarmName'] for alarm in desired_alarms])
+        for alarm in desired_alarms:
+            current = current_alarms.get(alarm['AlarmName'])
+            fields = alarm_diff(alarm, current)
+            if fields:
+                changes.append({
+                    'resource': 'alarm',
+                    'name': alarm['AlarmName'],
+                    'action': 'create' if current is None else 'update',
+                    'fields': fields,
+                    'apply': lambda alarm=alarm: self.call(self.cloudwatch.put_metric_alarm, **alarm)
+                })
+        
+        for change in changes:
+            fields = f" ({', '.join(change['fields'])})" if change.get('fields') and change['action'] == 'update' else ""
+            prefix = "Would" if dry_run else "Will"
+            self.log(f"🔧 {prefix} {change['action']} {change['resource']} {change['name']}{fields}")
+        
+        if not dry_run and changes:
+            # Writes go out in parallel, but few enough at a time to stay under the API rate limits
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                futures = {executor.submit(change['apply']): change for change in changes}
+            for future, change in futures.items():
+                try:
+                    future.result()
+                    change['status'] = 'applied'
+                except Exception as e:
+                    change['status'] = 'failed'
+                    self.log(f"❌ Error applying {change['resource']} {change['name']}: {e}")
+        
+        for change in changes:
+            del change['apply']
+            change.setdefault('status', 'planned' if dry_run else 'applied')
+        if not changes:
+            self.log("✅ Monitoring already up to date")
+        return changes
+    
+    def log(self, message):
+        # Lines from environments provisioned concurrently are tagged with the environment
+        print(f"[{self.label}] {message}" if self.label else message)
     
     def create_log_insights_queries(self):
         """Create CloudWatch Logs Insights queries for common issues"""
@@ -258,9 +432,85 @@ class MonitoringSetup:
         
         print("✅ Monitoring setup completed!")
 
+def load_manifest(path):
+    """Environments to provision from a JSON manifest, with shared defaults applied"""
+    # {"defaults": {...}, "environments": [{"name", "region", "cluster", "service", "alb", "sns_topic_arn"}]}
+    # or just the list of environments
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'environments': manifest}
+    
+    defaults = dict({'region': 'us-east-1', 'sns_topic_arn': None}, **manifest.get('defaults', {}))
+    environments = []
+    for environment in manifest['environments']:
+        environment = dict(defaults, **environment)
+        environment.setdefault('name', f"{environment['region']}/{environment['cluster']}/{environment['service']}")
+        environment.setdefault('name_prefix', f"{DEFAULT_NAME_PREFIX}-{environment['name'].replace('/', '-')}")
+        environments.append(environment)
+    return environments
+
+def provision_environments(environments, dry_run=False, max_workers=16, per_region=4, clients=None):
+    """Reconcile monitoring for many environments concurrently, returning one result per environment"""
+    # One CloudWatch client and one in-flight cap per region, shared by its environments;
+    # clients maps region -> client to use stand-ins instead of boto3
+    clients = dict(clients or {})
+    limits = {}
+    for environment in environments:
+        region = environment['region']
+        if region not in clients:
+            clients[region] = aws_client('cloudwatch', region)
+        limits.setdefault(region, threading.BoundedSemaphore(per_region))
+    
+    def provision(environment):
+        setup = MonitoringSetup(
+            environment['region'],
+            name_prefix=environment['name_prefix'],
+            cloudwatch=clients[environment['region']],
+            in_flight=limits[environment['region']],
+            label=environment['name']
+        )
+        start_time = time.perf_counter()
+        result = {'environment': environment['name'], 'region': environment['region']}
+        try:
+            changes = setup.reconcile(environment['cluster'], environment['service'], environment['alb'],
+                                      environment['sns_topic_arn'], dry_run=dry_run)
+            failed = [change for change in changes if change['status'] == 'failed']
+            result.update(status='failed' if failed else ('planned' if dry_run and changes else 'ok'),
+                          changes=len(changes), failed=len(failed))
+        except Exception as e:
+            result.update(status='error', error=str(e))
+        result.update(api_calls=setup.api_calls, seconds=round(time.perf_counter() - start_time, 3))
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(provision, environments))
+
 def main():
+    # --reconcile only changes what differs; --dry-run (implies --reconcile) only reports it
+    dry_run = '--dry-run' in sys.argv
+    reconcile = dry_run or '--reconcile' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg not in ('--dry-run', '--reconcile')]
+    
+    if len(sys.argv) > 2 and sys.argv[1] == '--manifest':
+        # Usage: python3 setup_monitoring.py --manifest <environments.json> [workers] [per_region] [--dry-run]
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+        per_region = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+        
+        start_time = time.perf_counter()
+        results = provision_environments(load_manifest(sys.argv[2]), dry_run, workers, per_region)
+        failed = [result for result in results if result['status'] in ('failed', 'error')]
+        print(json.dumps({
+            'environments': results,
+            'failed': len(failed),
+            'seconds': round(time.perf_counter() - start_time, 3)
+        }, indent=2))
+        sys.exit(1 if failed else 0)
+    
     if len(sys.argv) < 4:
-        print("Usage: python3 setup_monitoring.py <cluster_name> <service_name> <alb_name> [sns_topic_arn]")
+        print("Usage: python3 setup_monitoring.py <cluster_name> <service_name> <alb_name> [sns_topic_arn] "
+              "[--reconcile] [--dry-run]")
+        print("       python3 setup_monitoring.py --manifest <environments.json> [workers] [per_region] [--dry-run]")
         sys.exit(1)
     
     cluster_name = sys.argv[1]
@@ -272,7 +522,11 @@ def main():
         print("⚠️  No SNS topic ARN provided. Alarms will be created but won't send notifications.")
     
     monitor = MonitoringSetup()
-    monitor.setup_monitoring(cluster_name, service_name, alb_name, sns_topic_arn)
+    if reconcile:
+        changes = monitor.reconcile(cluster_name, service_name, alb_name, sns_topic_arn, dry_run=dry_run)
+        print(json.dumps({'changes': changes, 'api_calls': monitor.api_calls}, indent=2))
+    else:
+        monitor.setup_monitoring(cluster_name, service_name, alb_name, sns_topic_arn)
 
 if __name__ == "__main__":
     main()
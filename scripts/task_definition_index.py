@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Index of known-good ECS task definition revisions used for fast rollbacks
+"""
+
+import json
+import os
+from datetime import datetime
+
+DEFAULT_INDEX_PATH = os.path.join('~', '.cache', 'cartoon-animation-web', 'task-definitions.json')
+
+def service_key(target):
+    """Index key of a monitored service"""
+    return f"{target['cluster']}/{target['service']}"
+
+def task_family(task_definition_arn):
+    """Family name of a task definition ARN (arn:...:task-definition/family:revision)"""
+    return task_definition_arn.rsplit('/', 1)[-1].rsplit(':', 1)[0]
+
+class TaskDefinitionIndex:
+    """Known-good task definition revisions per service, newest first, persisted as JSON"""
+    def __init__(self, path=None, max_revisions=10):
+        self.path = os.path.expanduser(path or os.getenv('TASK_DEFINITION_INDEX_PATH', DEFAULT_INDEX_PATH))
+        self.max_revisions = max_revisions
+        self.entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading task definition index: {e}")
+    
+    def record_good(self, target, task_definition_arn):
+        """Remember a revision that passed deployment monitoring"""
+        key = service_key(target)
+        revisions = [r for r in self.entries.get(key, []) if r['arn'] != task_definition_arn]
+        revisions.insert(0, {'arn': task_definition_arn, 'recorded_at': datetime.utcnow().isoformat()})
+        self.entries[key] = revisions[:self.max_revisions]
+        self.save()
+    
+    def rollback_candidate(self, target, current_arn):
+        """Newest known-good revision other than the one currently deployed"""
+        for revision in self.entries.get(service_key(target), []):
+            if revision['arn'] != current_arn:
+                return revision['arn']
+        return None
+    
+    def save(self):
+        # Write to a temporary file and rename so a crash never leaves a truncated index
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
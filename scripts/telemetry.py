@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing spans and counters for the monitoring scripts, with batched exporters
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Prometheus histogram bucket bounds, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# CloudWatch EMF accepts at most 100 values per metric in one record
+EMF_MAX_VALUES = 100
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class Telemetry:
+    """Records spans and counters in memory; exporters receive them in batches on flush()"""
+    # A span costs two perf_counter calls and a deque append under a lock, cheap enough
+    # to leave on for every I/O call. Nothing is written until flush(), which exporters
+    # may rate limit further with flush_interval.
+    def __init__(self, exporters=None, flush_interval=10.0, max_pending=5000):
+        self.exporters = exporters or []
+        self.flush_interval = flush_interval
+        self.pending = deque(maxlen=max_pending)
+        self.counters = {}
+        self.durations = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.last_flush = time.monotonic()
+        self.dropped = 0
+    
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block; an exception is recorded on the span and re-raised"""
+        stack = self.local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        error = None
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.record(name, wall, duration, parent, error, attributes)
+    
+    def record(self, name, wall, duration, parent, error, attributes):
+        with self.lock:
+            # Individual spans are only kept for exporters; the aggregates below always are
+            if self.exporters:
+                if len(self.pending) == self.pending.maxlen:
+                    self.dropped += 1
+                self.pending.append({'name': name, 'start': round(wall, 6), 'duration_ms': round(duration * 1000, 3),
+                                     'parent': parent, 'error': error, 'thread': threading.current_thread().name,
+                                     **attributes})
+            
+            stats = self.durations.get(name)
+            if stats is None:
+                stats = self.durations[name] = {'count': 0, 'errors': 0, 'sum': 0.0, 'max': 0.0,
+                                                'buckets': [0] * len(DURATION_BUCKETS)}
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['max'] = max(stats['max'], duration)
+            if error:
+                stats['errors'] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][index] += 1
+                    break
+    
+    def count(self, name, value=1, **labels):
+        """Add to a counter, e.g. count('api_calls', api='ecs')"""
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def counter(self, name, **labels):
+        return self.counters.get((name, label_key(labels)), 0)
+    
+    def instrument(self, client, api):
+        """Wrap an API client so each call is a span and counted, with boto3 retries included"""
+        if client is None or isinstance(client, InstrumentedClient):
+            return client
+        return InstrumentedClient(client, self, api)
+    
+    def snapshot(self):
+        """Counters and per-span duration statistics recorded so far"""
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'durations': {name: dict(stats, buckets=list(stats['buckets']))
+                              for name, stats in self.durations.items()},
+                'dropped_spans': self.dropped
+            }
+    
+    def flush(self, force=False):
+        """Hand pending spans and current totals to every exporter, at most once per flush_interval"""
+        now = time.monotonic()
+        if not self.exporters or (not force and now - self.last_flush < self.flush_interval):
+            return
+        self.last_flush = now
+        
+        with self.lock:
+            spans = list(self.pending)
+            self.pending.clear()
+        snapshot = self.snapshot()
+        
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans, snapshot)
+            except Exception as e:
+                print(f"Error exporting telemetry to {exporter.path}: {e}")
+    
+    def report(self):
+        """One line per span name: calls, errors, mean and max duration"""
+        lines = []
+        for name, stats in sorted(self.snapshot()['durations'].items()):
+            mean = stats['sum'] / stats['count'] * 1000
+            lines.append(f"{name}: {stats['count']} calls, {stats['errors']} errors, "
+                         f"mean {mean:.1f}ms, max {stats['max'] * 1000:.1f}ms")
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{format_labels(labels)}: {value}")
+        return '\n'.join(lines)
+
+class InstrumentedClient:
+    """Proxy for an AWS client that times every operation it calls"""
+    def __init__(self, client, telemetry, api):
+        self.client = client
+        self.telemetry = telemetry
+        self.api = api
+    
+    def __getattr__(self, operation):
+        method = getattr(self.client, operation)
+        if not callable(method) or operation.startswith('_') or operation in ('meta', 'exceptions'):
+            return method
+        
+        telemetry, api = self.telemetry, self.api
+        
+        def call(*args, **kwargs):
+            telemetry.count('api_calls', api=api, operation=operation)
+            try:
+                with telemetry.span(f'{api}.{operation}'):
+                    response = method(*args, **kwargs)
+            except Exception:
+                telemetry.count('api_errors', api=api, operation=operation)
+                raise
+            
+            # boto3 retries throttling and transient errors itself and reports how often
+            if isinstance(response, dict):
+                retries = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+                if retries:
+                    telemetry.count('api_retries', retries, api=api, operation=operation)
+            return response
+        return call
+
+class PrometheusTextfile:
+    """Rewrites a Prometheus text-format file (for node_exporter's textfile collector) on each flush"""
+    def __init__(self, path, prefix='deployment_monitor'):
+        self.path = path
+        self.prefix = prefix
+    
+    def export(self, spans, snapshot):
+        lines = []
+        metric = f'{self.prefix}_span_duration_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        for name, stats in sorted(snapshot['durations'].items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{span="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {stats["sum"]:.6f}')
+            lines.append(f'{metric}_count{{span="{name}"}} {stats["count"]}')
+        
+        lines.append(f'# TYPE {self.prefix}_span_errors_total counter')
+        for name, stats in sorted(snapshot['durations'].items()):
+            lines.append(f'{self.prefix}_span_errors_total{{span="{name}"}} {stats["errors"]}')
+        
+        names = sorted({name for name, _ in snapshot['counters']})
+        for name in names:
+            lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            for (counter, labels), value in sorted(snapshot['counters'].items()):
+                if counter == name:
+                    lines.append(f'{self.prefix}_{name}_total{format_labels(labels)} {value}')
+        
+        # Written to a temporary file and renamed so the collector never reads a partial file
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temporary, self.path)
+
+class NDJSONTrace:
+    """Appends one JSON object per span to a trace file"""
+    def __init__(self, path):
+        self.path = path
+    
+    def export(self, spans, snapshot):
+        if not spans:
+            return
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(span, default=str) + '\n' for span in spans))
+
+class CloudWatchEMF:
+    """Appends CloudWatch Embedded Metric Format records, one per span name per flush"""
+    # The CloudWatch agent (or Lambda/ECS log drivers) turns these log lines into metrics
+    # without any PutMetricData calls; each record carries up to EMF_MAX_VALUES durations.
+    def __init__(self, path, namespace='CartoonAnimationWeb/DeploymentMonitor'):
+        self.path = path
+        self.namespace = namespace
+        self.reported = {}
+    
+    def export(self, spans, snapshot):
+        durations = {}
+        errors = {}
+        for span in spans:
+            durations.setdefault(span['name'], []).append(span['duration_ms'])
+            if span['error']:
+                errors[span['name']] = errors.get(span['name'], 0) + 1
+        
+        timestamp = int(time.time() * 1000)
+        records = []
+        for name, values in durations.items():
+            for offset in range(0, len(values), EMF_MAX_VALUES):
+                records.append({
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': self.namespace,
+                            'Dimensions': [['Span']],
+                            'Metrics': [{'Name': 'DurationMs', 'Unit': 'Milliseconds'},
+                                        {'Name': 'Errors', 'Unit': 'Count'}]
+                        }]
+                    },
+                    'Span': name,
+                    'DurationMs': values[offset:offset + EMF_MAX_VALUES],
+                    'Errors': errors.get(name, 0) if offset == 0 else 0
+                })
+        
+        # Counters are cumulative in memory; EMF wants the increase since the last flush
+        for (name, labels), value in snapshot['counters'].items():
+            increase = value - self.reported.get((name, labels), 0)
+            self.reported[(name, labels)] = value
+            if increase:
+                dimensions = dict(labels)
+                records.append({
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': self.namespace,
+                            'Dimensions': [sorted(dimensions)],
+                            'Metrics': [{'Name': name, 'Unit': 'Count'}]
+                        }]
+                    },
+                    **dimensions,
+                    name: increase
+                })
+        
+        if records:
+            with open(self.path, 'a') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+
+EXPORTERS = {'prometheus': PrometheusTextfile, 'ndjson': NDJSONTrace, 'emf': CloudWatchEMF}
+
+def telemetry_from_spec(spec, flush_interval=10.0):
+    """Telemetry exporting to e.g. "prometheus=/var/lib/node_exporter/monitor.prom,ndjson=trace.ndjson" """
+    exporters = []
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        kind, _, path = entry.partition('=')
+        if kind not in EXPORTERS or not path:
+            raise ValueError(f"Unknown telemetry exporter '{entry}' (expected {', '.join(EXPORTERS)}=<path>)")
+        exporters.append(EXPORTERS[kind](path))
+    return Telemetry(exporters, flush_interval=flush_interval)